@@ -37,7 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'webapp',
+    'webapp.apps.WebappConfig',
 ]
 
 MIDDLEWARE = [
@@ -48,6 +48,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'webapp.middleware.ReplicaPinMiddleware',
+    'webapp.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'project.urls'
@@ -68,6 +70,24 @@ TEMPLATES = [
     },
 ]
 
+# テンプレートのキャッシュ（本番用）
+# 読み込み＆コンパイル済みのテンプレートをプロセス内に保持する
+TEMPLATE_CACHE = not DEBUG
+
+# 起動時のウォームアップ
+# STARTUP_WARMUP = True の場合はワーカーがWSGIアプリケーション（project/wsgi.py）を読み込むときに
+# URL・テンプレート・データベース接続を準備する（管理コマンドでは行わない）
+# （/readyz はそのプロセスで準備が終わるまで・接続できないデータベースがある間は503を返す）
+STARTUP_WARMUP = not DEBUG
+if TEMPLATE_CACHE:
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
 WSGI_APPLICATION = 'project.wsgi.application'
 
 
@@ -81,9 +101,28 @@ DATABASES = {
         'USER': 'postgres',
         'HOST': 'db',
         'PORT': 5432,
+        # 接続をリクエストをまたいで使い回す（起動時に開いた接続を最初のリクエストで使えるようにする）
+        'CONN_MAX_AGE': 60,
     }
 }
 
+# リードレプリカ
+# 一覧・詳細ページのGETリクエストはREPLICA_DATABASESのいずれかから読み込む
+# 更新リクエストの後REPLICA_PIN_SECONDS秒間は、そのブラウザからの読み込みはdefaultで行う
+# 例）
+# DATABASES['replica1'] = {
+#     'ENGINE': 'django.db.backends.postgresql',
+#     'NAME': 'postgres',
+#     'USER': 'postgres',
+#     'HOST': 'db-replica1',
+#     'PORT': 5432,
+#     'TEST': {'MIRROR': 'default'},
+# }
+# REPLICA_DATABASES = ['replica1']
+REPLICA_DATABASES = []
+REPLICA_PIN_SECONDS = 10
+DATABASE_ROUTERS = ['webapp.routers.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -104,6 +143,32 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# パスワードのハッシュ化
+# PASSWORD_HASHER_PROFILEで新しいハッシュに使うアルゴリズムを選ぶ（'pbkdf2' / 'argon2' / 'bcrypt'）
+# 'argon2'はargon2-cffi、'bcrypt'はbcryptのインストールが必要
+# 既存のハッシュはログイン時に選んだアルゴリズム・パラメータで再ハッシュされる
+# 反復回数等は`python manage.py bench_hashers`で1コアあたりの処理数を確認して調整する
+PASSWORD_HASHER_PROFILE = os.environ.get('PASSWORD_HASHER_PROFILE', 'pbkdf2')
+PASSWORD_PBKDF2_ITERATIONS = 150000
+PASSWORD_ARGON2 = {
+    'time_cost': 2,
+    'memory_cost': 512,
+    'parallelism': 2,
+}
+PASSWORD_BCRYPT_ROUNDS = 12
+
+PASSWORD_HASHER_PROFILES = {
+    'pbkdf2': 'webapp.hashers.TunedPBKDF2PasswordHasher',
+    'argon2': 'webapp.hashers.TunedArgon2PasswordHasher',
+    'bcrypt': 'webapp.hashers.TunedBCryptSHA256PasswordHasher',
+}
+PASSWORD_HASHERS = [PASSWORD_HASHER_PROFILES[PASSWORD_HASHER_PROFILE]] + [
+    hasher for profile, hasher in PASSWORD_HASHER_PROFILES.items() if profile != PASSWORD_HASHER_PROFILE
+] + [
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/2.2/topics/i18n/
 
@@ -122,6 +187,12 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/2.2/howto/static-files/
 
 STATIC_URL = '/static/'
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
+# 本番ではファイル名に内容のハッシュを付けて長期間キャッシュさせる
+# （python manage.py build_assets → collectstatic → compress_static の順に実行）
+if not DEBUG:
+    STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage'
 
 # カスタムユーザーモデル
 AUTH_USER_MODEL = 'webapp.User'
@@ -134,6 +205,9 @@ LOGIN_REDIRECT_URL = 'webapp:top'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
+# ユーザーごとの画像の使用容量の上限（バイト、Noneは無制限）
+MEDIA_QUOTA_BYTES = None
+
 # メッセージのタグをbootstrapのクラス名に合わせる
 from django.contrib.messages import constants as messages
 MESSAGE_TAGS = {
@@ -143,3 +217,73 @@ MESSAGE_TAGS = {
 
 # メールをコンソールに表示
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+
+# バックグラウンドタスク
+# TASK_ALWAYS_EAGER = True にするとワーカーを介さずコミット時に同期実行する（テスト用）
+TASK_ALWAYS_EAGER = False
+TASK_MAX_ATTEMPTS = 3
+TASK_RETRY_DELAY_SECONDS = 60
+TASK_LEASE_SECONDS = 60*5
+
+# ユーザー削除
+# USER_SOFT_DELETE = True の場合は論理削除して、データはバックグラウンドでPURGE_BATCH_SIZE件ずつ削除する
+USER_SOFT_DELETE = True
+PURGE_BATCH_SIZE = 1000
+
+# 一覧ページのページネーション
+# PAGINATION_COUNT_FREE = True の場合は件数を数えずに前後のページのみ表示する
+PAGINATION_COUNT_FREE = False
+
+# アイテム一覧ページ
+# ITEM_LIST_STREAMING = True の場合は説明の抜粋だけを読み込んでカードを順次送信し、説明・画像はカードを開いたときに読み込む
+ITEM_LIST_STREAMING = False
+ITEM_LIST_PAGE_SIZE = 10
+
+# キャッシュ
+# 複数プロセスで動かす場合はmemcached等の共有キャッシュを設定する
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# アイテムフォームのカテゴリ選択肢・カテゴリの有無のキャッシュ期間
+# カテゴリ数がCATEGORY_CHOICES_LIMITを超える場合は入力補完で選択する
+CATEGORY_CHOICES_TIMEOUT = 60*5
+CATEGORY_CHOICES_LIMIT = 200
+
+# レート制限（トークンバケット）
+# 名前: (バケットの容量, 容量分のトークンが補充されるまでの秒数)
+# login_email はログインに失敗したときだけトークンを取り出す
+RATELIMITS = {
+    'activation': (10, 60),
+    'login': (20, 60),
+    'login_email': (5, 60),
+    'user_create': (5, 60*10),
+    'user_create_email': (3, 60*10),
+    'password_reset': (5, 60*10),
+    'password_reset_email': (3, 60*10),
+}
+# プロキシ経由の場合はクライアントのIPアドレスが入るヘッダーを設定する（例: 'HTTP_X_FORWARDED_FOR'）
+RATELIMIT_IP_HEADER = None
+
+# 仮登録のまま有効期限（ACTIVATION_TIMEOUT_SECONDS）が切れたユーザーの削除間隔
+PURGE_INACTIVE_USERS_INTERVAL = 60*60
+
+# アイテムのアーカイブ
+# ITEM_ARCHIVE_DAYS日以上更新されていないアイテムをITEM_ARCHIVE_BATCH_SIZE件ずつアーカイブする
+# （アーカイブ済みのアイテムは一覧・件数に含めず、アーカイブ済みアイテム一覧ページで元に戻せる）
+ITEM_ARCHIVE_DAYS = 365
+ITEM_ARCHIVE_BATCH_SIZE = 1000
+ITEM_ARCHIVE_INTERVAL = 60*60*24
+
+# プロファイリング
+# PROFILING_ENABLED = True の場合、webappのビューへのリクエストのうち
+# PROFILING_SAMPLE_RATEの割合、またはスタッフが`X-Profile`ヘッダー・`_profile`パラメータを付けたものを
+# PROFILING_DIRに保存する（.prof: cProfileの結果、.json: SQL・テンプレートの描画時間・関数ごとの時間、
+# .speedscope.json: PROFILING_SAMPLE_INTERVAL秒ごとにサンプリングしたスタック（https://www.speedscope.app で表示する））
+# （サンプリングの間隔はGILの切り替え間隔（sys.getswitchinterval()）より短くならない）
+PROFILING_ENABLED = False
+PROFILING_SAMPLE_RATE = 0.0
+PROFILING_SAMPLE_INTERVAL = 0.001
+PROFILING_DIR = os.path.join(BASE_DIR, 'profiles')
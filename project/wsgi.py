@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/2.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
 
 application = get_wsgi_application()
+
+# 最初のリクエストを待たずにURL・テンプレート・データベース接続を準備する
+# （管理コマンドでは行わない。ワーカーはフォーク後にこのモジュールを読み込む前提で、gunicornの--preloadは使わない）
+if getattr(settings, 'STARTUP_WARMUP', False):
+    from webapp.warmup import warm_up
+    warm_up()
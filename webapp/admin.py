@@ -1,7 +1,109 @@
 from django.contrib import admin
-from .models import User, Category, Item
+from .models import User, Category, Item, Task, releasing_media
+from .paginators import EstimatedCountPaginator
+
+
+class CategoryAdmin(admin.ModelAdmin):
+    """
+    カテゴリ管理
+    """
+    list_display = ('name', 'owner', 'order', 'updated_at')
+    list_select_related = ('owner',)
+    raw_id_fields = ('owner', 'parent')
+    # オーナーのメールアドレスで完全一致検索（大文字・小文字を区別してユニークインデックスを使う）
+    # （'='はiexactになりUPPER()の比較でインデックスを使えない）
+    search_fields = ('owner__email__exact',)
+    ordering = ('-pk',)
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+
+    def delete_model(self, request, obj):
+        # 子孫のカテゴリごと削除されるアイテムの画像の使用容量を減らす
+        with releasing_media(Item.all_objects.filter(owner_id=obj.owner_id, category__in=obj.subtree())):
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        for category in queryset:
+            self.delete_model(request, category)
+
+
+class ArchivedListFilter(admin.SimpleListFilter):
+    """
+    アーカイブ済みかどうかで絞り込む（部分インデックスの条件と同じ条件にする）
+    """
+    title = 'アーカイブ'
+    parameter_name = 'archived'
+
+    def lookups(self, request, model_admin):
+        return (('0', '未アーカイブ'), ('1', 'アーカイブ済み'))
+
+    def queryset(self, request, queryset):
+        if self.value() in ('0', '1'):
+            return queryset.filter(archived_at__isnull=self.value() == '0')
+        return queryset
+
+
+class ItemAdmin(admin.ModelAdmin):
+    """
+    アイテム管理
+    """
+    list_display = ('title', 'owner', 'category', 'order', 'updated_at', 'archived_at')
+    list_filter = (ArchivedListFilter,)
+    list_select_related = ('owner', 'category')
+    raw_id_fields = ('owner', 'category')
+    # オーナーのメールアドレスで完全一致検索（大文字・小文字を区別してユニークインデックスを使う）
+    # （'='はiexactになりUPPER()の比較でインデックスを使えない）
+    search_fields = ('owner__email__exact',)
+    ordering = ('-pk',)
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+
+    def get_readonly_fields(self, request, obj=None):
+        # 保存・削除はオーナーで絞り込むため、追加後はオーナーを変更しない
+        if obj is not None:
+            return ('owner',)
+        return ()
+
+    def save_model(self, request, obj, form, change):
+        # 変更は主キーに加えてオーナーで絞り込んで保存する（パーティションの絞り込みのため）
+        if change:
+            fields = [field.name for field in Item._meta.concrete_fields if not field.primary_key]
+            Item.all_objects.save_fields(obj, fields)
+        else:
+            super().save_model(request, obj, form, change)
+
+    def delete_model(self, request, obj):
+        # 主キーに加えてオーナーで絞り込んで削除し、画像の使用容量を減らす
+        items = Item.all_objects.filter(pk=obj.pk, owner_id=obj.owner_id)
+        with releasing_media(items):
+            items.delete()
+
+    def delete_queryset(self, request, queryset):
+        with releasing_media(queryset):
+            super().delete_queryset(request, queryset)
+
+    def get_queryset(self, request):
+        # アーカイブ済みのアイテムも表示する
+        queryset = Item.all_objects.get_queryset()
+        ordering = self.get_ordering(request)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return queryset
+
+
+class TaskAdmin(admin.ModelAdmin):
+    """
+    バックグラウンドタスク管理
+    """
+    list_display = ('name', 'status', 'priority', 'attempts', 'run_at')
+    # 状態（状態・実行日時のインデックスの先頭の列）で絞り込む
+    list_filter = ('status',)
+    ordering = ('-pk',)
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
 
 
 admin.site.register(User)
-admin.site.register(Category)
-admin.site.register(Item)
+admin.site.register(Category, CategoryAdmin)
+admin.site.register(Item, ItemAdmin)
+admin.site.register(Task, TaskAdmin)
@@ -0,0 +1,81 @@
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+from .models import Category, tree_order
+
+
+def _key(name, user_pk):
+    return 'webapp:{}:{}'.format(name, user_pk)
+
+
+def category_choices(user_pk):
+    """
+    ユーザーのカテゴリの選択肢（主キー, 親カテゴリからの名前）のリストを親→子の順で返す
+    """
+    key = _key('category_choices', user_pk)
+    choices = cache.get(key)
+    if choices is None:
+        categories = tree_order(
+            Category.objects.filter(owner_id=user_pk).only('name', 'parent', 'path', 'order', 'created_at')
+        )
+        names = {category.pk: category.name for category in categories}
+        choices = [
+            (category.pk, ' / '.join(names[pk] for pk in category.ancestor_pks() + [category.pk]))
+            for category in categories
+        ]
+        cache.set(key, choices, getattr(settings, 'CATEGORY_CHOICES_TIMEOUT', 60*5))
+    return choices
+
+
+def has_categories(user_pk):
+    """
+    ユーザーがカテゴリを持っているかを返す
+    （プロセスごとのキャッシュでは他のプロセスの削除が届かないため、期限を付けて保持する）
+    """
+    key = _key('has_categories', user_pk)
+    result = cache.get(key)
+    if result is None:
+        result = Category.objects.filter(owner_id=user_pk).exists()
+        cache.set(key, result, getattr(settings, 'CATEGORY_CHOICES_TIMEOUT', 60*5))
+    return result
+
+
+def landing_url(user):
+    """
+    トップページの表示先（カテゴリ一覧 or アイテム一覧ページ）のURLを返す
+    """
+    if has_categories(user.pk):
+        return reverse('webapp:category_list')
+    else:
+        return reverse('webapp:item_list')
+
+
+def invalidate_categories(user_pk):
+    """
+    ユーザーのカテゴリに関するキャッシュを削除する
+    """
+    cache.delete_many([
+        _key('category_choices', user_pk),
+        _key('has_categories', user_pk),
+    ])
+
+
+def use_token(*tokens):
+    """
+    トークンを使用済みにする（すでに使用済みの場合はFalse）
+    """
+    return cache.add(_token_key(tokens), True, getattr(settings, 'ACTIVATION_TIMEOUT_SECONDS', 60*60*24))
+
+
+def is_token_used(*tokens):
+    """
+    トークンが使用済みかを返す
+    """
+    return cache.get(_token_key(tokens)) is not None
+
+
+def _token_key(tokens):
+    # トークンの有効期限が切れるまで保持する（期限切れのトークンは署名の確認で弾かれる）
+    digest = hashlib.sha256('/'.join(tokens).encode()).hexdigest()
+    return _key('used_token', digest)
@@ -1,6 +1,13 @@
 from django import forms
+from django.conf import settings
 from django.contrib.auth import forms as auth_forms
-from .models import User, Category, Item
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.template import loader
+from django.template.defaultfilters import filesizeformat
+from django.urls import reverse
+from . import caches, tasks
+from .models import User, Category, Item, released_image_size
 
 
 class AuthenticationForm(auth_forms.AuthenticationForm):
@@ -75,6 +82,14 @@ class PasswordResetForm(auth_forms.PasswordResetForm):
             field.widget.attrs['class'] = 'form-control'
             field.widget.attrs['placeholder'] = field.label
 
+    def send_mail(self, subject_template_name, email_template_name,
+                  context, from_email, to_email, html_email_template_name=None):
+        # メールの送信はバックグラウンドタスクで行う
+        subject = loader.render_to_string(subject_template_name, context)
+        subject = ''.join(subject.splitlines())
+        body = loader.render_to_string(email_template_name, context)
+        tasks.enqueue(tasks.send_mail, subject, body, [to_email])
+
 
 class SetPasswordForm(auth_forms.SetPasswordForm):
     """
@@ -92,13 +107,109 @@ class CategoryForm(forms.ModelForm):
     """
     class Meta:
         model = Category
-        fields = ('name',)
+        fields = ('name', 'parent', 'version',)
         widgets = {
             'name': forms.TextInput(attrs={
                 'class': 'form-control',
             }),
+            'version': forms.HiddenInput(),
         }
 
+    def __init__(self, *args, **kwargs):
+        # ユーザー（カテゴリのオーナー）を取得
+        user = kwargs.pop('user')
+        super().__init__(*args, **kwargs)
+
+        # 親カテゴリ選択フィールド
+        self.fields['parent'] = CategoryChoiceField(
+            user,
+            label='親カテゴリ',
+            widget = forms.Select(attrs={
+                'class': 'form-control',
+            }),
+            required = False,
+            empty_label = 'なし',
+        )
+
+        # バージョンは変更時のみ（同時更新の検出に使う）
+        if self.instance.pk is None:
+            del self.fields['version']
+
+    def clean_parent(self):
+        # 親カテゴリを取得して、循環・階層の深さを確認
+        parent = self.cleaned_data['parent']
+        if parent is None:
+            return None
+        parent = Category.objects.get(pk=parent.pk)
+        if self.instance.pk and parent.path.startswith(self.instance.path):
+            raise ValidationError('このカテゴリ自身またはその下のカテゴリは親カテゴリにできません。')
+        if len(parent.path) + 11 > Category._meta.get_field('path').max_length:
+            raise ValidationError('これ以上深い階層にはできません。')
+        return parent
+
+
+class CategoryAutocompleteWidget(forms.Widget):
+    """
+    カテゴリ名の入力補完ウィジェット（カテゴリが多いユーザー用）
+    """
+    template_name = 'widgets/category_autocomplete.html'
+
+    def __init__(self, names, attrs=None):
+        super().__init__(attrs)
+        self.names = names
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        try:
+            context['widget']['label'] = self.names.get(int(value), '')
+        except (TypeError, ValueError):
+            context['widget']['label'] = ''
+        context['widget']['url'] = reverse('webapp:category_search')
+        return context
+
+
+class CategoryChoiceField(forms.ChoiceField):
+    """
+    カテゴリ選択フィールド
+    （キャッシュした選択肢から選び、カテゴリのモデルは取得しない）
+    """
+    def __init__(self, user, **kwargs):
+        self.user = user
+        empty_label = kwargs.pop('empty_label', '---------')
+        choices = caches.category_choices(user.pk)
+        self.names = dict(choices)
+        if len(choices) > getattr(settings, 'CATEGORY_CHOICES_LIMIT', 200):
+            # 選択肢が多い場合は入力補完にする
+            kwargs['widget'] = CategoryAutocompleteWidget(self.names)
+            choices = []
+        else:
+            choices = [('', empty_label)] + choices
+        super().__init__(choices=choices, **kwargs)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            pk = int(value)
+        except (TypeError, ValueError):
+            pk = None
+        if pk not in self.names:
+            raise ValidationError(self.error_messages['invalid_choice'], code='invalid_choice', params={'value': value})
+        return Category(pk=pk, name=self.names[pk], owner=self.user)
+
+    def validate(self, value):
+        if value is None and self.required:
+            raise ValidationError(self.error_messages['required'], code='required')
+
+    def has_changed(self, initial, data):
+        # 初期値（主キー or カテゴリ）と入力値を主キーで比べる
+        if self.disabled:
+            return False
+        initial = getattr(initial, 'pk', initial)
+        initial = str(initial) if initial not in self.empty_values else ''
+        data = str(data) if data not in self.empty_values else ''
+        return initial != data
+
 
 class ItemForm(forms.ModelForm):
     """
@@ -106,7 +217,7 @@ class ItemForm(forms.ModelForm):
     """
     class Meta:
         model = Item
-        fields = ('title','description','image','url','mark','category',)
+        fields = ('title','description','image','url','mark','version',)
         widgets = {
             'title': forms.TextInput(attrs={
                 'class': 'form-control',
@@ -123,6 +234,7 @@ class ItemForm(forms.ModelForm):
             'mark': forms.Select(attrs={
                 'class': 'form-control',
             }),
+            'version': forms.HiddenInput(),
         }
 
     def __init__(self, *args, **kwargs):
@@ -130,15 +242,71 @@ class ItemForm(forms.ModelForm):
         user = kwargs.pop('user')
         category = kwargs.pop('category')
         super().__init__(*args, **kwargs)
+        self.user = user
 
         # カテゴリ選択フィールド
-        self.fields['category'] = forms.ModelChoiceField(
+        self.fields['category'] = CategoryChoiceField(
+            user,
             widget = forms.Select(attrs={
                 'class': 'form-control',
             }),
-            queryset = Category.objects.filter(owner=user),
             required = False,
             empty_label = 'カテゴリなし',
             label = 'カテゴリ',
-            initial = category,
+            initial = self.instance.category_id if self.instance.pk else category,
+        )
+        self.order_fields(['title','description','image','url','mark','category'])
+
+        # バージョンは変更時のみ（同時更新の検出に使う）
+        if self.instance.pk is None:
+            del self.fields['version']
+
+    def clean_image(self):
+        # 画像の使用容量の上限を確認（オーナーの使用容量の合計と比べるだけでファイルは調べない）
+        # 同時にアップロードした場合の上限は保存時にも確認する
+        image = self.cleaned_data['image']
+        quota = getattr(settings, 'MEDIA_QUOTA_BYTES', None)
+        if quota is None or not isinstance(image, UploadedFile):
+            return image
+        owner = self.owner
+        used = owner.media_bytes
+        if self.instance.pk and self.instance.image:
+            # 置き換える画像の分は空く
+            used -= released_image_size(self.instance)
+        if used + image.size > quota:
+            raise self.quota_error(owner.media_bytes)
+        return image
+
+    @property
+    def owner(self):
+        # アイテムのオーナー（スーパーユーザーが他のユーザーのアイテムを変更する場合はそのユーザー）
+        if self.instance.pk and self.instance.owner_id != self.user.pk:
+            return self.instance.owner
+        return self.user
+
+    def quota_error(self, used):
+        """
+        画像の使用容量の上限を超えた場合のエラーを返す
+        """
+        return ValidationError(
+            '画像の使用容量の上限（{}）を超えるためアップロードできません（使用中: {}）。'.format(
+                filesizeformat(getattr(settings, 'MEDIA_QUOTA_BYTES', None)), filesizeformat(used),
+            ),
+            code='quota',
         )
+
+    def clean(self):
+        # カテゴリはモデルを取得せずに設定する
+        # （選択肢はキャッシュなので、他のプロセスで削除されていないかだけを確認する）
+        cleaned_data = super().clean()
+        if 'category' in cleaned_data:
+            category = cleaned_data['category']
+            if category is not None and not Category.objects.filter(pk=category.pk, owner_id=self.owner.pk).exists():
+                self.add_error('category', ValidationError(
+                    self.fields['category'].error_messages['invalid_choice'],
+                    code='invalid_choice',
+                    params={'value': category.pk},
+                ))
+            else:
+                self.instance.category = category
+        return cleaned_data
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class TunedPBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """
+    反復回数を設定（PASSWORD_PBKDF2_ITERATIONS）で変更できるPBKDF2
+    （反復回数が異なるハッシュはログイン時に再ハッシュされる）
+    """
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_PBKDF2_ITERATIONS', hashers.PBKDF2PasswordHasher.iterations)
+
+
+class TunedArgon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """
+    パラメータを設定（PASSWORD_ARGON2）で変更できるArgon2（argon2-cffiが必要）
+    """
+    @property
+    def time_cost(self):
+        return self._option('time_cost')
+
+    @property
+    def memory_cost(self):
+        return self._option('memory_cost')
+
+    @property
+    def parallelism(self):
+        return self._option('parallelism')
+
+    def _option(self, name):
+        return getattr(settings, 'PASSWORD_ARGON2', {}).get(name, getattr(hashers.Argon2PasswordHasher, name))
+
+
+class TunedBCryptSHA256PasswordHasher(hashers.BCryptSHA256PasswordHasher):
+    """
+    ラウンド数を設定（PASSWORD_BCRYPT_ROUNDS）で変更できるbcrypt（bcryptが必要）
+    """
+    @property
+    def rounds(self):
+        return getattr(settings, 'PASSWORD_BCRYPT_ROUNDS', hashers.BCryptSHA256PasswordHasher.rounds)
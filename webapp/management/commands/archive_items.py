@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from webapp import tasks
+
+
+class Command(BaseCommand):
+    """
+    一定日数更新されていないアイテムをアーカイブする
+    """
+    help = 'Archive items that have not been updated for a number of days, in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='Archive items not updated for this many days (default: ITEM_ARCHIVE_DAYS).')
+        parser.add_argument('--dry-run', action='store_true', help='Only show the number of items to archive.')
+        parser.add_argument('--schedule', action='store_true', help='Register the periodic background task instead.')
+
+    def handle(self, *args, **options):
+        if options['schedule']:
+            if tasks.schedule(tasks.archive_items, priority=-1):
+                self.stdout.write('Scheduled the archive task.')
+            else:
+                self.stdout.write('The archive task is already scheduled.')
+            return
+
+        if options['dry_run']:
+            self.stdout.write('{} items would be archived.'.format(tasks.stale_items(options['days']).count()))
+            return
+
+        total = 0
+        while True:
+            archived = tasks.archive_items_batch(options['days'])
+            total += archived
+            if archived == 0:
+                break
+        self.stdout.write('Archived {} items.'.format(total))
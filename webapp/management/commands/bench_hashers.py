@@ -0,0 +1,56 @@
+import multiprocessing
+import time
+from django.conf import settings
+from django.contrib.auth.hashers import get_hashers
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    """
+    パスワードのハッシュ化の処理数（1コアあたり・全コア）を計測する
+    """
+    help = 'Measure password hashes per second per core for the configured hashers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=3.0, help='Seconds to hash per measurement.')
+        parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count(), help='Number of processes for the all-core measurement.')
+        parser.add_argument('--target-ms', type=float, default=None, help='Suggest a PBKDF2 iteration count for this time per hash.')
+
+    def handle(self, *args, **options):
+        seconds = options['seconds']
+        processes = options['processes']
+        for hasher in get_hashers():
+            if hasher.library:
+                try:
+                    hasher._load_library()
+                except ValueError:
+                    self.stdout.write('{:<30} skipped (required library is not installed)'.format(hasher.algorithm))
+                    continue
+
+            path = '{}.{}'.format(type(hasher).__module__, type(hasher).__name__)
+            per_core = measure(path, seconds)
+            with multiprocessing.Pool(processes) as pool:
+                total = sum(pool.starmap(measure, [(path, seconds)] * processes))
+            self.stdout.write('{:<30} {:8.1f} hashes/s per core  {:8.1f} hashes/s on {} processes  ({:.1f} ms/hash)'.format(
+                hasher.algorithm, per_core, total, processes, 1000 / per_core,
+            ))
+
+            if options['target_ms'] and hasher.algorithm == 'pbkdf2_sha256':
+                suggested = int(hasher.iterations * options['target_ms'] * per_core / 1000)
+                self.stdout.write('  PASSWORD_PBKDF2_ITERATIONS = {} for {} ms/hash'.format(suggested, options['target_ms']))
+
+        self.stdout.write('Preferred hasher: {}'.format(settings.PASSWORD_HASHERS[0]))
+
+
+def measure(path, seconds):
+    """
+    指定した秒数の間ハッシュ化を繰り返し、1秒あたりの処理数を返す
+    """
+    hasher = next(h for h in get_hashers() if '{}.{}'.format(type(h).__module__, type(h).__name__) == path)
+    salt = hasher.salt()
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        hasher.encode('benchmark-password', salt)
+        count += 1
+    return count / (time.perf_counter() - start)
@@ -0,0 +1,91 @@
+import random
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+
+class Command(BaseCommand):
+    """
+    アイテム一覧の取得時間とVACUUM時間を、パーティション分割あり／なしのテーブルで比較する
+    """
+    help = 'Compare list latency and vacuum time of partitioned and unpartitioned item tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000000, help='Number of rows per table.')
+        parser.add_argument('--owners', type=int, default=10000, help='Number of distinct owners.')
+        parser.add_argument('--partitions', type=int, default=16, help='Number of hash partitions.')
+        parser.add_argument('--queries', type=int, default=1000, help='Number of list queries to time.')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark tables.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('This benchmark requires PostgreSQL.')
+
+        tables = {
+            'unpartitioned': 'bench_item_heap',
+            'partitioned': 'bench_item_part',
+        }
+        with connection.cursor() as cursor:
+            self.create_tables(cursor, tables, options)
+            owners = [random.randint(1, options['owners']) for _ in range(options['queries'])]
+            for label, table in tables.items():
+                latency = self.time_list(cursor, table, owners)
+                vacuum = self.time_vacuum(cursor, table)
+                self.stdout.write('{:<14} list avg {:8.3f} ms  p99 {:8.3f} ms  vacuum {:8.2f} s'.format(
+                    label, latency['avg'], latency['p99'], vacuum,
+                ))
+            if not options['keep']:
+                for table in tables.values():
+                    cursor.execute('DROP TABLE IF EXISTS {}'.format(table))
+
+    def create_tables(self, cursor, tables, options):
+        columns = (
+            'id bigint NOT NULL, owner_id integer NOT NULL, category_id integer, '
+            '"order" integer NOT NULL, title varchar(100) NOT NULL, description text, '
+            'created_at timestamptz NOT NULL'
+        )
+        for table in tables.values():
+            cursor.execute('DROP TABLE IF EXISTS {}'.format(table))
+        cursor.execute('CREATE TABLE {} ({}, PRIMARY KEY (id))'.format(tables['unpartitioned'], columns))
+        cursor.execute('CREATE TABLE {} ({}, PRIMARY KEY (id, owner_id)) PARTITION BY HASH (owner_id)'.format(
+            tables['partitioned'], columns,
+        ))
+        for remainder in range(options['partitions']):
+            cursor.execute('CREATE TABLE {0}_p{1} PARTITION OF {0} FOR VALUES WITH (MODULUS {2}, REMAINDER {1})'.format(
+                tables['partitioned'], remainder, options['partitions'],
+            ))
+
+        for table in tables.values():
+            self.stdout.write('Loading {} rows into {} ...'.format(options['rows'], table))
+            cursor.execute(
+                'INSERT INTO {} SELECT g, 1 + g %% %s, NULL, g / %s, md5(g::text), repeat(md5(g::text), 10), now() '
+                'FROM generate_series(1, %s) AS g'.format(table),
+                [options['owners'], options['owners'], options['rows']],
+            )
+            cursor.execute('CREATE INDEX {0}_owner_idx ON {0} (owner_id, category_id, "order")'.format(table))
+            cursor.execute('ANALYZE {}'.format(table))
+
+    def time_list(self, cursor, table, owners):
+        # ItemListと同じ形のクエリ
+        sql = (
+            'SELECT * FROM {} WHERE owner_id = %s AND category_id IS NULL '
+            'ORDER BY "order", created_at DESC LIMIT 10'.format(table)
+        )
+        timings = []
+        for owner in owners:
+            start = time.perf_counter()
+            cursor.execute(sql, [owner])
+            cursor.fetchall()
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        return {
+            'avg': sum(timings) / len(timings),
+            'p99': timings[int(len(timings) * 0.99) - 1],
+        }
+
+    def time_vacuum(self, cursor, table):
+        # 1割の行を削除してからVACUUMする
+        cursor.execute('DELETE FROM {} WHERE id % 10 = 0'.format(table))
+        start = time.perf_counter()
+        cursor.execute('VACUUM {}'.format(table))
+        return time.perf_counter() - start
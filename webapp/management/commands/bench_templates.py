@@ -0,0 +1,73 @@
+import time
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.template import Engine, RequestContext, engines
+from django.test import RequestFactory
+from django.utils import timezone
+from webapp.models import User, Item
+
+
+class Command(BaseCommand):
+    """
+    アイテム一覧ページの描画時間をキャッシュローダーあり／なしで比較する
+    """
+    help = 'Measure item_list.html render time with and without the cached template loader.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--renders', type=int, default=200, help='Number of renders to time.')
+        parser.add_argument('--items', type=int, default=10, help='Number of item cards.')
+
+    def handle(self, *args, **options):
+        loaders = [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]
+        profiles = {
+            'uncached': loaders,
+            'cached': [('django.template.loaders.cached.Loader', loaders)],
+        }
+        default = engines['django'].engine
+        request = self.build_request()
+        context = self.build_context(options['items'])
+        for label, engine_loaders in profiles.items():
+            # 設定のテンプレートエンジンとローダー以外は同じ条件にする
+            engine = Engine(
+                dirs=default.dirs,
+                loaders=engine_loaders,
+                context_processors=default.context_processors,
+                libraries=default.libraries,
+                builtins=default.builtins,
+            )
+            timings = []
+            for _ in range(options['renders']):
+                start = time.perf_counter()
+                template = engine.get_template('item_list.html')
+                template.render(RequestContext(request, context))
+                timings.append((time.perf_counter() - start) * 1000)
+            first = timings[0]
+            timings.sort()
+            self.stdout.write('{:<9} first {:7.3f} ms  median {:7.3f} ms  avg {:7.3f} ms'.format(
+                label, first, timings[len(timings) // 2], sum(timings) / len(timings),
+            ))
+
+    def build_request(self):
+        request = RequestFactory().get('/item_list/')
+        request.user = User(pk=1, email='bench@example.com')
+        return request
+
+    def build_context(self, count):
+        now = timezone.now()
+        items = [
+            Item(pk=pk, title='アイテム{}'.format(pk), description='説明\n' * 5, order=pk, created_at=now, mark=1)
+            for pk in range(1, count + 1)
+        ]
+        page_obj = Paginator(items, count).page(1)
+        return {
+            'item_list': items,
+            'page_obj': page_obj,
+            'paginator': page_obj.paginator,
+            'is_paginated': False,
+            'category_count': 0,
+            'first_pk': items[0].pk,
+            'last_pk': items[-1].pk,
+        }
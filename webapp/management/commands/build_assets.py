@@ -0,0 +1,169 @@
+import glob
+import gzip
+import os
+import re
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 結合するCSS（先頭から順に）
+SOURCES = [
+    os.path.join(APP_DIR, 'assets', 'bootstrap-4.5.3.min.css'),
+    os.path.join(APP_DIR, 'static', 'css', 'base.css'),
+]
+OUTPUT = os.path.join(APP_DIR, 'static', 'css', 'bundle.css')
+
+# クラス名の抽出
+CLASS_ATTR_RE = re.compile(r'''class(?:=|['"]?\s*:\s*)\s*['"]([^'"]*)['"]''')
+CLASS_SELECTOR_RE = re.compile(r'\.(-?[_a-zA-Z][_a-zA-Z0-9-]*)')
+NOT_RE = re.compile(r':not\([^)]*\)')
+JS_STRING_RE = re.compile(r'''['"]([_a-zA-Z0-9 -]+)['"]''')
+
+
+class Command(BaseCommand):
+    """
+    CSSを結合して使われていないルールを除き、圧縮したバンドル（css/bundle.css）を作成する
+    """
+    help = 'Build the minified CSS bundle with only the rules used by the templates.'
+
+    def handle(self, *args, **options):
+        used, prefixes = used_classes()
+        before = ''.join(read(path) for path in SOURCES)
+        css = ''.join(subset(parse(minify(read(path))), used, prefixes) for path in SOURCES)
+        with open(OUTPUT, 'w') as f:
+            f.write(css)
+
+        self.stdout.write('Wrote {}'.format(os.path.relpath(OUTPUT, settings.BASE_DIR)))
+        self.stdout.write('{:<8} {:>10} {:>10} {:>10}'.format('', 'raw', 'gzip', 'brotli'))
+        for label, text in (('before', before), ('after', css)):
+            data = text.encode()
+            self.stdout.write('{:<8} {:>10} {:>10} {:>10}'.format(
+                label, len(data), len(gzip.compress(data, 9)), len(brotli.compress(data)) if brotli else '-',
+            ))
+
+
+def read(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def used_classes():
+    """
+    テンプレート・フォーム・スクリプトで使われているクラス名を返す
+    （テンプレート変数を含むクラス名は前方一致で扱う）
+    """
+    used = set()
+    prefixes = set()
+    files = (
+        glob.glob(os.path.join(APP_DIR, 'templates', '**', '*.html'), recursive=True)
+        + glob.glob(os.path.join(APP_DIR, '*.py'))
+        + glob.glob(os.path.join(APP_DIR, 'templatetags', '*.py'))
+    )
+    for path in files:
+        for value in CLASS_ATTR_RE.findall(read(path)):
+            for name in re.sub(r'{%.*?%}', ' ', value).split():
+                if '{{' in name:
+                    prefixes.add(name.split('{{')[0])
+                else:
+                    used.add(name)
+    for path in glob.glob(os.path.join(APP_DIR, 'static', '**', '*.js'), recursive=True):
+        for value in JS_STRING_RE.findall(read(path)):
+            used.update(value.split())
+    prefixes.discard('')
+    return used, prefixes
+
+
+def minify(css):
+    """
+    コメントと余分な空白を取り除く
+    """
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};:,>])\s*', r'\1', css)
+    return css.replace(';}', '}').strip()
+
+
+def parse(css):
+    """
+    CSSを（前置き, 宣言 or 子ルールのリスト）のリストに分解する
+    """
+    rules = []
+    position = 0
+    while position < len(css):
+        start = css.find('{', position)
+        if start < 0:
+            break
+        prelude = css[position:start].strip()
+        # 対応する閉じ括弧を探す
+        depth = 0
+        for end in range(start, len(css)):
+            if css[end] == '{':
+                depth += 1
+            elif css[end] == '}':
+                depth -= 1
+                if depth == 0:
+                    break
+        body = css[start + 1:end]
+        if prelude.startswith(('@media', '@supports')):
+            rules.append((prelude, parse(body)))
+        else:
+            rules.append((prelude, body))
+        position = end + 1
+    return rules
+
+
+def subset(rules, used, prefixes):
+    """
+    使われていないクラスを含むセレクタと参照されていないアニメーションを除いてCSSに戻す
+    """
+    kept = []
+    keyframes = []
+    for prelude, body in rules:
+        if isinstance(body, list):
+            children = subset(body, used, prefixes)
+            if children:
+                kept.append('{}{{{}}}'.format(prelude, children))
+        elif prelude.startswith(('@keyframes', '@-webkit-keyframes')):
+            keyframes.append((prelude.split()[-1], '{}{{{}}}'.format(prelude, body)))
+        elif prelude.startswith('@'):
+            kept.append('{}{{{}}}'.format(prelude, body))
+        else:
+            selectors = [s for s in split_selectors(prelude) if is_used(s, used, prefixes)]
+            if selectors:
+                kept.append('{}{{{}}}'.format(','.join(selectors), body))
+    css = ''.join(kept)
+    names = set()
+    for value in re.findall(r'animation(?:-name)?:([^;}]*)', css):
+        names.update(re.split(r'[\s,]+', value))
+    return css + ''.join(text for name, text in keyframes if name in names)
+
+
+def split_selectors(prelude):
+    selectors = []
+    depth = 0
+    current = ''
+    for char in prelude:
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        if char == ',' and depth == 0:
+            selectors.append(current)
+            current = ''
+        else:
+            current += char
+    selectors.append(current)
+    return selectors
+
+
+def is_used(selector, used, prefixes):
+    for name in CLASS_SELECTOR_RE.findall(NOT_RE.sub('', selector)):
+        if name not in used and not name.startswith(tuple(prefixes)):
+            return False
+    return True
@@ -0,0 +1,40 @@
+import gzip
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 圧縮するファイルの拡張子
+EXTENSIONS = ('.css', '.js', '.svg', '.txt', '.json')
+
+
+class Command(BaseCommand):
+    """
+    STATIC_ROOTのテキストファイルを事前に圧縮（.gz・.br）しておく
+    """
+    help = 'Write pre-compressed .gz (and .br if brotli is installed) files next to collected static files.'
+
+    def handle(self, *args, **options):
+        root = getattr(settings, 'STATIC_ROOT', None)
+        if not root or not os.path.isdir(root):
+            raise CommandError('Run collectstatic first.')
+
+        count = 0
+        for directory, _, names in os.walk(root):
+            for name in names:
+                if not name.endswith(EXTENSIONS):
+                    continue
+                path = os.path.join(directory, name)
+                with open(path, 'rb') as f:
+                    data = f.read()
+                with open(path + '.gz', 'wb') as f:
+                    f.write(gzip.compress(data, 9))
+                if brotli:
+                    with open(path + '.br', 'wb') as f:
+                        f.write(brotli.compress(data))
+                count += 1
+        self.stdout.write('Compressed {} files{}'.format(count, '' if brotli else ' (brotli is not installed)'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from webapp import tasks
+
+
+class Command(BaseCommand):
+    """
+    仮登録のまま有効期限が切れたユーザーを削除する
+    """
+    help = 'Delete users whose registration was never activated, in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only show the number of users to delete.')
+        parser.add_argument('--schedule', action='store_true', help='Register the periodic background task instead.')
+
+    def handle(self, *args, **options):
+        if options['schedule']:
+            if tasks.schedule(tasks.purge_inactive_users, priority=-1):
+                self.stdout.write('Scheduled the purge task.')
+            else:
+                self.stdout.write('The purge task is already scheduled.')
+            return
+
+        if options['dry_run']:
+            self.stdout.write('{} users would be deleted.'.format(tasks.stale_inactive_users().count()))
+            return
+
+        total = 0
+        while True:
+            deleted = tasks.purge_inactive_users_batch()
+            total += deleted
+            if deleted == 0:
+                break
+        self.stdout.write('Deleted {} users.'.format(total))
@@ -0,0 +1,86 @@
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from webapp.models import User, Item
+
+
+class Command(BaseCommand):
+    """
+    画像ファイルを1回走査して、アイテムの画像サイズとユーザーごとの使用容量を再計算する
+    """
+    help = 'Recompute item image sizes and per-user media usage in a single pass over MEDIA_ROOT.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report the differences.')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        sizes = scan(os.path.join(settings.MEDIA_ROOT, 'images'))
+
+        # オーナー順に流し読みし、オーナーごとに異なるファイルのサイズを合計する
+        totals = {}
+        referenced = set()
+        missing = 0
+        fixed_items = 0
+        items = (
+            Item.all_objects
+            .exclude(image='').exclude(image__isnull=True)
+            .order_by('owner_id')
+            .values_list('pk', 'owner_id', 'image', 'image_size')
+        )
+        owner_id = None
+        names = set()
+        for pk, owner, name, image_size in items.iterator():
+            if owner != owner_id:
+                owner_id, names = owner, set()
+            size = sizes.get(name)
+            if size is None:
+                missing += 1
+                self.stdout.write('Missing file: {} (item {})'.format(name, pk))
+                size = 0
+            referenced.add(name)
+            if size != image_size:
+                fixed_items += 1
+                if not dry_run:
+                    Item.all_objects.filter(pk=pk, owner_id=owner).update(image_size=size)
+            if name not in names:
+                names.add(name)
+                totals[owner] = totals.get(owner, 0) + size
+
+        fixed_users = 0
+        for pk, media_bytes in User.objects.values_list('pk', 'media_bytes').iterator():
+            total = totals.get(pk, 0)
+            if total != media_bytes:
+                fixed_users += 1
+                self.stdout.write('User {}: {} -> {} bytes'.format(pk, media_bytes, total))
+                if not dry_run:
+                    User.objects.filter(pk=pk).update(media_bytes=total)
+
+        orphans = [name for name in sizes if name not in referenced]
+        self.stdout.write('{} files ({} bytes), {} missing, {} orphaned ({} bytes).'.format(
+            len(sizes), sum(sizes.values()), missing, len(orphans), sum(sizes[name] for name in orphans),
+        ))
+        self.stdout.write('{} {} item sizes and {} user totals.'.format(
+            'Would fix' if dry_run else 'Fixed', fixed_items, fixed_users,
+        ))
+
+
+def scan(root):
+    """
+    ディレクトリ以下のファイル名（MEDIA_ROOTからの相対パス）とサイズの辞書を返す
+    """
+    sizes = {}
+    stack = [root]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file():
+                    name = os.path.relpath(entry.path, settings.MEDIA_ROOT).replace(os.sep, '/')
+                    sizes[name] = entry.stat().st_size
+    return sizes
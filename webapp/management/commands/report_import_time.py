@@ -0,0 +1,70 @@
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+# python -X importtime の出力（import time: self [us] | cumulative | imported package）
+IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$')
+
+
+class Command(BaseCommand):
+    """
+    起動時のモジュールの読み込み時間（python -X importtime）を新しいプロセスで計測して集計する
+    """
+    help = 'Report cold-start import times of a module using python -X importtime.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', default='project.wsgi', help='Module to import, as a server does at startup.')
+        parser.add_argument('--top', type=int, default=20, help='Number of slowest modules to show.')
+        parser.add_argument('--output', help='Append the result as a JSON line to this file to track it over time.')
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', 'import {}'.format(options['module'])],
+            cwd=settings.BASE_DIR,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+        )
+        if process.returncode != 0:
+            raise CommandError('Importing {} failed:\n{}'.format(options['module'], process.stderr[-2000:]))
+
+        modules = []
+        for line in process.stderr.splitlines():
+            match = IMPORTTIME_RE.match(line)
+            if match:
+                modules.append((match.group(4), int(match.group(1)), int(match.group(2)), len(match.group(3))))
+        if not modules:
+            raise CommandError('No import times were reported.')
+
+        # トップレベルのパッケージごとに集計
+        packages = defaultdict(int)
+        for name, self_us, _, _ in modules:
+            packages[name.split('.')[0]] += self_us
+        total = sum(packages.values())
+
+        self.stdout.write('Importing {}: {:.1f} ms, {} modules'.format(options['module'], total / 1000, len(modules)))
+        self.stdout.write('By package:')
+        for name, self_us in sorted(packages.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write('  {:<30} {:8.1f} ms {:5.1f}%'.format(name, self_us / 1000, 100 * self_us / total))
+        self.stdout.write('Slowest modules (cumulative):')
+        for name, _, cumulative, _ in sorted(modules, key=lambda module: -module[2])[:options['top']]:
+            self.stdout.write('  {:<50} {:8.1f} ms'.format(name, cumulative / 1000))
+
+        if options['output']:
+            with open(options['output'], 'a') as f:
+                f.write(json.dumps({
+                    'date': timezone.now().isoformat(),
+                    'module': options['module'],
+                    'total_ms': round(total / 1000, 1),
+                    'modules': len(modules),
+                    'packages': {name: round(self_us / 1000, 1) for name, self_us in packages.items()},
+                }) + '\n')
+            self.stdout.write('Appended to {}'.format(options['output']))
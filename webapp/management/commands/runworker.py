@@ -0,0 +1,82 @@
+import logging
+import multiprocessing
+import signal
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+from webapp import tasks
+
+logger = logging.getLogger(__name__)
+
+# DB障害などで失敗が続いたときの待ち時間の上限（秒）
+MAX_BACKOFF = 60
+
+
+class Command(BaseCommand):
+    """
+    バックグラウンドタスクのワーカーを起動する
+    """
+    help = 'Run background task workers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help='Number of worker processes.')
+        parser.add_argument('--sleep', type=float, default=1.0, help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty.')
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        if processes <= 1:
+            work(options['sleep'], options['once'])
+            return
+
+        # 親プロセスの接続を子プロセスに引き継がない
+        connections.close_all()
+        workers = [
+            multiprocessing.Process(target=work, args=(options['sleep'], options['once']))
+            for _ in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+
+        # 親プロセスへのシグナルを子プロセスに伝える
+        def terminate(signum, frame):
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+        signal.signal(signal.SIGTERM, terminate)
+        signal.signal(signal.SIGINT, terminate)
+
+        for worker in workers:
+            worker.join()
+
+
+def work(sleep, once):
+    """
+    キューが空になるまでタスクを実行し続ける
+    """
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+    signal.signal(signal.SIGINT, lambda signum, frame: stopping.append(signum))
+
+    failures = 0
+    while not stopping:
+        try:
+            # 切断された接続や寿命を過ぎた接続を捨ててから取得する
+            close_old_connections()
+            task = tasks.claim()
+            if task is not None:
+                tasks.run(task)
+        except Exception:
+            # ワーカーを止めずに、失敗が続くほど間隔を空けて再試行する
+            logger.exception('Worker loop failed')
+            connections.close_all()
+            failures += 1
+            time.sleep(min(sleep * 2 ** failures, MAX_BACKOFF))
+            continue
+        failures = 0
+        if task is not None:
+            continue
+        if once:
+            break
+        time.sleep(sleep)
+    connections.close_all()
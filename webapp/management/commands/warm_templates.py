@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from webapp.warmup import warm_templates
+
+
+class Command(BaseCommand):
+    """
+    全テンプレートを読み込んでキャッシュローダーをウォームアップする
+    """
+    help = 'Load and compile all templates into the cached template loader.'
+
+    def handle(self, *args, **options):
+        count = warm_templates()
+        if count == 0:
+            self.stdout.write('The cached template loader is not enabled.')
+        else:
+            self.stdout.write('Warmed {} templates.'.format(count))
@@ -0,0 +1,241 @@
+import cProfile
+import json
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Template
+from django.test.utils import CaptureQueriesContext
+from django.urls import Resolver404, resolve
+from django.utils import timezone
+
+
+class ReplicaPinMiddleware:
+    """
+    更新リクエストの後、一定時間はリードレプリカを使わないようにするミドルウェア
+    （自分の更新がすぐに画面に反映されるようにする）
+    """
+    cookie_name = 'db_pin'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.db_pinned = self.cookie_name in request.COOKIES
+        response = self.get_response(request)
+        if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            response.set_cookie(
+                self.cookie_name,
+                '1',
+                max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 10),
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+
+class StackSampler:
+    """
+    別スレッドから一定間隔で対象スレッドのスタックを記録する（speedscopeのsampled形式で保存する）
+    """
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = []
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+        self.end = time.perf_counter()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            self.samples.append((time.perf_counter(), stack[::-1]))
+
+    def speedscope(self, name):
+        """
+        speedscope（https://www.speedscope.app）のファイル形式に変換する
+        """
+        frames = []
+        indexes = {}
+        samples = []
+        weights = []
+        previous = self.start
+        for at, stack in self.samples:
+            sample = []
+            for key in stack:
+                if key not in indexes:
+                    indexes[key] = len(frames)
+                    frames.append({'name': key[0], 'file': key[1], 'line': key[2]})
+                sample.append(indexes[key])
+            samples.append(sample)
+            weights.append(round((at - previous) * 1000, 3))
+            previous = at
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'shared': {'frames': frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'milliseconds',
+                'startValue': 0,
+                'endValue': round((self.end - self.start) * 1000, 3),
+                'samples': samples,
+                'weights': weights,
+            }],
+            'name': name,
+            'exporter': 'webapp.middleware.ProfilingMiddleware',
+        }
+
+
+class ProfiledContent:
+    """
+    ストリーミングのレスポンスを送信し終わった（または閉じられた）ときに一度だけfinishを呼ぶ
+    """
+    def __init__(self, content, finish):
+        self.content = content
+        self.finish = finish
+        self.finished = False
+
+    def __iter__(self):
+        try:
+            yield from self.content
+        finally:
+            self.close()
+
+    def close(self):
+        if not self.finished:
+            self.finished = True
+            self.finish()
+
+
+class ProfilingMiddleware:
+    """
+    リクエストのプロファイル（cProfile・スタックのサンプリング・SQL・テンプレートの描画時間）を保存するミドルウェア
+    （PROFILING_ENABLEDが有効な場合のみ使われる。ストリーミングのレスポンスは送信し終わるまでを対象にする）
+    """
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        stack = ExitStack()
+        captures = [stack.enter_context(CaptureQueriesContext(connection)) for connection in connections.all()]
+        interval = getattr(settings, 'PROFILING_SAMPLE_INTERVAL', 0.001)
+        sampler = stack.enter_context(StackSampler(threading.get_ident(), interval))
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+
+        def finish(response):
+            profiler.disable()
+            elapsed = time.perf_counter() - start
+            stack.close()
+            queries = [query for capture in captures for query in capture.captured_queries]
+            self.save(request, response, profiler, sampler, queries, elapsed)
+
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            profiler.disable()
+            stack.close()
+            raise
+        if response.streaming:
+            response.streaming_content = ProfiledContent(response.streaming_content, lambda: finish(response))
+        else:
+            finish(response)
+        return response
+
+    def should_profile(self, request):
+        # webappのビューのみ対象
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return False
+        if match.app_name != 'webapp':
+            return False
+
+        # スタッフはヘッダー or クエリパラメータで指定できる
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            if request.META.get('HTTP_X_PROFILE') or request.GET.get('_profile'):
+                return True
+
+        # 一定の割合でサンプリング
+        return random.random() < getattr(settings, 'PROFILING_SAMPLE_RATE', 0)
+
+    def save(self, request, response, profiler, sampler, queries, elapsed):
+        directory = getattr(settings, 'PROFILING_DIR', os.path.join(settings.BASE_DIR, 'profiles'))
+        os.makedirs(directory, exist_ok=True)
+        match = resolve(request.path_info)
+        basename = os.path.join(directory, '{}-{}-{}'.format(
+            timezone.now().strftime('%Y%m%d%H%M%S%f'), match.url_name, uuid.uuid4().hex[:8],
+        ))
+
+        # cProfileの結果（`python -m pstats`やsnakevizで表示する）
+        profiler.dump_stats(basename + '.prof')
+
+        # サンプリングしたスタック（speedscopeで表示する）
+        with open(basename + '.speedscope.json', 'w') as f:
+            json.dump(sampler.speedscope('{} {}'.format(request.method, request.get_full_path())), f)
+
+        # テンプレートの描画時間はTemplate.renderの累積時間から求める
+        stats = pstats.Stats(profiler)
+        code = Template.render.__code__
+        cc, template_calls, tt, template_seconds, callers = stats.stats.get(
+            (code.co_filename, code.co_firstlineno, code.co_name), (0, 0, 0, 0, {}),
+        )
+
+        summary = {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': match.view_name,
+            'user': getattr(getattr(request, 'user', None), 'pk', None),
+            'status': response.status_code,
+            'total_ms': round(elapsed * 1000, 3),
+            'sql': {
+                'count': len(queries),
+                'total_ms': round(sum(float(query['time']) for query in queries) * 1000, 3),
+                'queries': [{'sql': query['sql'], 'ms': round(float(query['time']) * 1000, 3)} for query in queries],
+            },
+            'templates': {
+                'render_calls': template_calls,
+                'total_ms': round(template_seconds * 1000, 3),
+            },
+            'functions': [
+                {
+                    'function': '{}:{}({})'.format(filename, line, function),
+                    'calls': nc,
+                    'tottime_ms': round(tt * 1000, 3),
+                    'cumtime_ms': round(ct * 1000, 3),
+                }
+                for (filename, line, function), (cc, nc, tt, ct, callers)
+                in sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:50]
+            ],
+        }
+        with open(basename + '.json', 'w') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
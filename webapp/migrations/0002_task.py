@@ -0,0 +1,39 @@
+# Generated by Django 2.2.28 on 2026-10-19 05:26
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Task',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, verbose_name='タスク名')),
+                ('args', models.TextField(default='[]', verbose_name='引数')),
+                ('kwargs', models.TextField(default='{}', verbose_name='キーワード引数')),
+                ('priority', models.IntegerField(default=0, verbose_name='優先度')),
+                ('status', models.CharField(choices=[('queued', '待機中'), ('running', '実行中'), ('failed', '失敗')], default='queued', max_length=10, verbose_name='状態')),
+                ('attempts', models.IntegerField(default=0, verbose_name='試行回数')),
+                ('max_attempts', models.IntegerField(default=3, verbose_name='最大試行回数')),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='実行予定日時')),
+                ('last_error', models.TextField(blank=True, verbose_name='エラー内容')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+            ],
+            options={
+                'verbose_name': 'タスク',
+                'verbose_name_plural': 'タスク',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['status', 'run_at'], name='webapp_task_status_run_at'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.28 on 2026-10-19 05:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0003_user_deleted_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='version',
+            field=models.IntegerField(default=0, verbose_name='バージョン'),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='version',
+            field=models.IntegerField(default=0, verbose_name='バージョン'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+from django.db import migrations
+
+# パーティション数
+PARTITIONS = 16
+
+
+def partition_item(apps, schema_editor):
+    """
+    webapp_itemをowner_idのハッシュでパーティション分割する（PostgreSQL 11以降のみ）
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql' or connection.pg_version < 110000:
+        return
+    schema_editor.execute('ALTER TABLE webapp_item RENAME TO webapp_item_old')
+    schema_editor.execute(
+        'CREATE TABLE webapp_item (LIKE webapp_item_old INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+        'PARTITION BY HASH (owner_id)'
+    )
+    for remainder in range(PARTITIONS):
+        schema_editor.execute(
+            'CREATE TABLE webapp_item_p{0} PARTITION OF webapp_item '
+            'FOR VALUES WITH (MODULUS {1}, REMAINDER {0})'.format(remainder, PARTITIONS)
+        )
+    # 主キーにはパーティションキーを含める必要がある
+    schema_editor.execute('ALTER TABLE webapp_item ADD CONSTRAINT webapp_item_pkey_part PRIMARY KEY (id, owner_id)')
+    _create_constraints(schema_editor)
+    schema_editor.execute('INSERT INTO webapp_item SELECT * FROM webapp_item_old')
+    schema_editor.execute('ALTER SEQUENCE webapp_item_id_seq OWNED BY webapp_item.id')
+    schema_editor.execute('DROP TABLE webapp_item_old')
+
+
+def unpartition_item(apps, schema_editor):
+    """
+    パーティション分割を元に戻す
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql' or connection.pg_version < 110000:
+        return
+    schema_editor.execute('ALTER TABLE webapp_item RENAME TO webapp_item_old')
+    schema_editor.execute('DROP INDEX webapp_item_owner_id_idx, webapp_item_category_id_idx')
+    schema_editor.execute(
+        'CREATE TABLE webapp_item (LIKE webapp_item_old INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+    )
+    schema_editor.execute('ALTER TABLE webapp_item ADD CONSTRAINT webapp_item_pkey PRIMARY KEY (id)')
+    _create_constraints(schema_editor)
+    schema_editor.execute('INSERT INTO webapp_item SELECT * FROM webapp_item_old')
+    schema_editor.execute('ALTER SEQUENCE webapp_item_id_seq OWNED BY webapp_item.id')
+    schema_editor.execute('DROP TABLE webapp_item_old')
+
+
+def _create_constraints(schema_editor):
+    schema_editor.execute(
+        'ALTER TABLE webapp_item ADD CONSTRAINT webapp_item_owner_id_fk FOREIGN KEY (owner_id) '
+        'REFERENCES webapp_user (id) DEFERRABLE INITIALLY DEFERRED'
+    )
+    schema_editor.execute(
+        'ALTER TABLE webapp_item ADD CONSTRAINT webapp_item_category_id_fk FOREIGN KEY (category_id) '
+        'REFERENCES webapp_category (id) DEFERRABLE INITIALLY DEFERRED'
+    )
+    schema_editor.execute('CREATE INDEX webapp_item_owner_id_idx ON webapp_item (owner_id)')
+    schema_editor.execute('CREATE INDEX webapp_item_category_id_idx ON webapp_item (category_id)')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0004_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_item, unpartition_item),
+    ]
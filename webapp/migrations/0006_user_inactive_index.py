@@ -0,0 +1,17 @@
+# Generated by Django 2.2.28 on 2026-10-19 05:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0005_partition_item'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('is_active', False), ('last_login__isnull', True)), fields=['date_joined'], name='webapp_user_inactive_joined'),
+        ),
+    ]
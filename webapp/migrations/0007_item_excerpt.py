@@ -0,0 +1,43 @@
+# Generated by Django 2.2.28 on 2026-10-19 05:41
+
+from django.db import migrations, models, transaction
+
+EXCERPT_LENGTH = 100
+BATCH_SIZE = 1000
+
+
+def fill_excerpt(apps, schema_editor):
+    # 既存のアイテムの説明の抜粋を一定件数ずつ1回のUPDATEで設定する（バッチごとにコミット）
+    Item = apps.get_model('webapp', 'Item')
+    queryset = Item.objects.exclude(description__isnull=True).exclude(description='').order_by('pk')
+    last_pk = 0
+    while True:
+        items = list(queryset.filter(pk__gt=last_pk).only('pk', 'owner_id', 'description')[:BATCH_SIZE])
+        if not items:
+            break
+        for item in items:
+            text = ' '.join(item.description.split())
+            if len(text) > EXCERPT_LENGTH:
+                text = text[:EXCERPT_LENGTH] + '…'
+            item.excerpt = text
+        with transaction.atomic():
+            Item.objects.bulk_update(items, ['excerpt'])
+        last_pk = items[-1].pk
+
+
+class Migration(migrations.Migration):
+    # 大きなテーブルを1つのトランザクションで更新しない
+    atomic = False
+
+    dependencies = [
+        ('webapp', '0006_user_inactive_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='excerpt',
+            field=models.CharField(blank=True, default='', editable=False, max_length=101, verbose_name='説明の抜粋'),
+        ),
+        migrations.RunPython(fill_excerpt, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.28 on 2026-10-19 05:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0007_item_excerpt'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(image__gt=''), fields=['image'], name='webapp_item_image'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 2.2.28 on 2026-10-19 05:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0008_item_image_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='archived_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='アーカイブ日時'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(archived_at__isnull=True), fields=['owner', 'category', 'order'], name='webapp_item_active'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(archived_at__isnull=True), fields=['updated_at'], name='webapp_item_active_updated'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(archived_at__isnull=False), fields=['owner', '-archived_at'], name='webapp_item_archived'),
+        ),
+    ]
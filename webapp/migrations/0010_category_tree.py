@@ -0,0 +1,44 @@
+# Generated by Django 2.2.28 on 2026-10-19 05:47
+
+from django.db import migrations, models
+from django.db.models.functions import Cast, Concat
+import django.db.models.deletion
+
+
+def fill_path(apps, schema_editor):
+    # 既存のカテゴリはすべてルートにする
+    Category = apps.get_model('webapp', 'Category')
+    Category.objects.update(path=Concat(
+        models.Value('/'), Cast('pk', models.CharField()), models.Value('/'),
+        output_field=models.CharField(),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0009_item_archived_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.IntegerField(default=0, editable=False, verbose_name='階層'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='children', to='webapp.Category', verbose_name='親カテゴリ'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(default='', editable=False, max_length=255, verbose_name='経路'),
+        ),
+        migrations.RunPython(fill_path, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['owner', 'path'], name='webapp_category_path', opclasses=['int4_ops', 'varchar_pattern_ops']),
+        ),
+    ]
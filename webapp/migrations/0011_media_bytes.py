@@ -0,0 +1,23 @@
+# Generated by Django 2.2.28 on 2026-10-19 05:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0010_category_tree'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='image_size',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='画像のサイズ'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='media_bytes',
+            field=models.BigIntegerField(default=0, verbose_name='画像の使用容量'),
+        ),
+    ]
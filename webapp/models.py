@@ -1,7 +1,11 @@
+from contextlib import contextmanager
+from django.conf import settings
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Concat, Substr
 from django.dispatch import receiver
+from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
 
@@ -46,6 +50,8 @@ class User(AbstractUser):
     """
     username = models.CharField(_('username'), max_length=150, blank=True)
     email = models.EmailField(_('email address'), unique=True)
+    deleted_at = models.DateTimeField('削除日時', null=True, blank=True)
+    media_bytes = models.BigIntegerField('画像の使用容量', default=0)
 
     objects = UserManager()
 
@@ -53,19 +59,53 @@ class User(AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # 仮登録のまま放置されたユーザーの削除用
+            models.Index(
+                fields=['date_joined'],
+                name='webapp_user_inactive_joined',
+                condition=models.Q(is_active=False, last_login__isnull=True),
+            ),
+        ]
+
 
 class Category(models.Model):
     """
     カテゴリモデル
+    （pathは祖先から自分までの主キーを並べた経路で、部分木の検索・移動に使う）
     """
     name = models.CharField(
         verbose_name='名前',
         max_length=100,
     )
+    parent = models.ForeignKey(
+        'self',
+        verbose_name='親カテゴリ',
+        related_name='children',
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+    )
+    path = models.CharField(
+        verbose_name='経路',
+        max_length=255,
+        default='',
+        editable=False,
+    )
+    depth = models.IntegerField(
+        verbose_name='階層',
+        default=0,
+        editable=False,
+    )
     order = models.IntegerField(
         verbose_name='順序',
         default=0,
     )
+    version = models.IntegerField(
+        verbose_name='バージョン',
+        default=0,
+    )
     owner = models.ForeignKey(
         User,
         verbose_name='オーナー',
@@ -83,9 +123,163 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+    def subtree(self):
+        """
+        自分と子孫のカテゴリ
+        """
+        return Category.objects.filter(owner_id=self.owner_id, path__startswith=self.path)
+
+    def ancestor_pks(self):
+        """
+        祖先のカテゴリの主キー（ルートから順に）
+        """
+        return [int(pk) for pk in self.path.strip('/').split('/')[:-1]]
+
     class Meta:
         verbose_name = 'カテゴリ'
         verbose_name_plural = 'カテゴリ'
+        indexes = [
+            # 部分木の前方一致検索用
+            models.Index(fields=['owner', 'path'], name='webapp_category_path', opclasses=['int4_ops', 'varchar_pattern_ops']),
+        ]
+
+
+def category_path(parent, pk):
+    """
+    親カテゴリの経路に主キーを付け足した経路を返す
+    """
+    return '{}{}/'.format(parent.path if parent else '/', pk)
+
+
+def move_category(category, parent):
+    """
+    カテゴリを部分木ごと別の親カテゴリの下に移動する（1回のUPDATEで子孫の経路・階層も書き換える）
+    """
+    old_path = category.path
+    new_path = category_path(parent, category.pk)
+    delta = (parent.depth + 1 if parent else 0) - category.depth
+    Category.objects.filter(owner_id=category.owner_id, path__startswith=old_path).update(
+        path=Concat(models.Value(new_path), Substr('path', len(old_path) + 1)),
+        depth=models.F('depth') + delta,
+        parent=models.Case(
+            models.When(pk=category.pk, then=models.Value(parent.pk if parent else None)),
+            default=models.F('parent'),
+            output_field=models.IntegerField(),
+        ),
+    )
+    category.parent = parent
+    category.path = new_path
+    category.depth += delta
+
+
+class MediaQuotaExceeded(Exception):
+    """
+    画像の使用容量の上限を超えた
+    """
+    pass
+
+
+def released_image_size(item):
+    """
+    アイテムが画像を参照しなくなったときに減る使用容量を返す
+    （カテゴリの複製で同じオーナーの他のアイテムと共有している画像は0）
+    """
+    shared = Item.all_objects.filter(owner_id=item.owner_id, image=item.image.name).exclude(pk=item.pk).exists()
+    return 0 if shared else item.image_size
+
+
+@contextmanager
+def releasing_media(items):
+    """
+    アイテムを削除するブロックの前後で、オーナーの画像の使用容量を減らして画像ファイルの削除を予約する
+    （削除前に1回だけ計算し、削除しないアイテムと共有している画像は減らさず、削除するアイテム同士の共有は1回だけ数える）
+    """
+    from . import tasks
+    with transaction.atomic():
+        images = dict(
+            ((owner_id, name), size)
+            for owner_id, name, size in items.filter(image__gt='').values_list('owner_id', 'image', 'image_size')
+        )
+        shared = set()
+        if images:
+            shared = set(Item.all_objects.filter(
+                owner_id__in={owner_id for owner_id, name in images},
+                image__in={name for owner_id, name in images},
+            ).exclude(pk__in=items.values('pk')).values_list('owner_id', 'image'))
+        yield
+
+        released = {}
+        for (owner_id, name), size in images.items():
+            if (owner_id, name) not in shared:
+                released[owner_id] = released.get(owner_id, 0) + size
+        for owner_id, size in released.items():
+            if size:
+                User.objects.filter(pk=owner_id).update(media_bytes=models.F('media_bytes') - size)
+        if images:
+            tasks.enqueue(tasks.delete_files, sorted({name for owner_id, name in images}))
+
+
+def tree_order(categories):
+    """
+    カテゴリのリストを親→子の順（兄弟は順序の順）に並べ替える
+    """
+    categories = list(categories)
+    children = {}
+    for category in sorted(categories, key=lambda c: (c.order, -c.created_at.timestamp())):
+        children.setdefault(category.parent_id, []).append(category)
+    pks = {category.pk for category in categories}
+    result = []
+    stack = [c for parent_pk, siblings in children.items() if parent_pk not in pks for c in siblings][::-1]
+    while stack:
+        category = stack.pop()
+        result.append(category)
+        stack.extend(children.get(category.pk, [])[::-1])
+    return result
+
+
+# 一覧に表示する説明の抜粋の文字数
+EXCERPT_LENGTH = 100
+
+
+def make_excerpt(description):
+    """
+    説明の抜粋（改行・連続する空白をまとめて先頭だけにしたもの）を返す
+    """
+    text = ' '.join((description or '').split())
+    if len(text) > EXCERPT_LENGTH:
+        text = text[:EXCERPT_LENGTH] + '…'
+    return text
+
+
+class ItemQuerySet(models.QuerySet):
+    """
+    アイテムのクエリセット
+    """
+    def save_fields(self, item, update_fields):
+        """
+        アイテムの指定した列を主キーとオーナーで絞り込んだUPDATEで保存して、更新した行数を返す
+        （オーナーの指定でパーティションを絞り込む。保存前後のシグナルはsave()と同じように送る）
+        """
+        update_fields = frozenset(update_fields)
+        models.signals.pre_save.send(sender=Item, instance=item, raw=False, using=self.db, update_fields=update_fields)
+        values = {}
+        for name in update_fields:
+            field = Item._meta.get_field(name)
+            values[field.attname] = field.pre_save(item, False)
+        updated = self.filter(pk=item.pk, owner_id=item.owner_id).update(**values)
+        if updated:
+            models.signals.post_save.send(
+                sender=Item, instance=item, created=False, raw=False, using=self.db, update_fields=update_fields,
+            )
+        return updated
+
+
+class ItemManager(models.Manager.from_queryset(ItemQuerySet)):
+    """
+    アイテムマネージャー（アーカイブ済みのアイテムを除く）
+    """
+    def get_queryset(self):
+        return super().get_queryset().filter(archived_at__isnull=True)
 
 
 class Item(models.Model):
@@ -108,12 +302,24 @@ class Item(models.Model):
         blank=True,
         null=True,
     )
+    excerpt = models.CharField(
+        verbose_name='説明の抜粋',
+        max_length=EXCERPT_LENGTH + 1,
+        blank=True,
+        default='',
+        editable=False,
+    )
     image = models.ImageField(
         verbose_name='画像',
         upload_to='images/',
         null=True,
         blank=True,
     )
+    image_size = models.BigIntegerField(
+        verbose_name='画像のサイズ',
+        default=0,
+        editable=False,
+    )
     url = models.URLField(
         verbose_name='URL',
         blank=True,
@@ -136,6 +342,10 @@ class Item(models.Model):
         verbose_name='順序',
         default=0,
     )
+    version = models.IntegerField(
+        verbose_name='バージョン',
+        default=0,
+    )
     owner = models.ForeignKey(
         User,
         verbose_name='オーナー',
@@ -149,6 +359,15 @@ class Item(models.Model):
         verbose_name='更新日時',
         auto_now=True,
     )
+    archived_at = models.DateTimeField(
+        verbose_name='アーカイブ日時',
+        null=True,
+        blank=True,
+    )
+
+    # 通常はアーカイブ済みのアイテムを除き、all_objectsは全アイテムを対象にする
+    objects = ItemManager()
+    all_objects = ItemQuerySet.as_manager()
 
     def __str__(self):
         return self.title
@@ -156,21 +375,154 @@ class Item(models.Model):
     class Meta:
         verbose_name = 'アイテム'
         verbose_name_plural = 'アイテム'
+        indexes = [
+            # 共有している画像の参照確認用
+            models.Index(fields=['image'], name='webapp_item_image', condition=models.Q(image__gt='')),
+            # 一覧・並び替え用（アーカイブ済みのアイテムを含めない）
+            models.Index(
+                fields=['owner', 'category', 'order'],
+                name='webapp_item_active',
+                condition=models.Q(archived_at__isnull=True),
+            ),
+            # アーカイブ対象の検索用
+            models.Index(
+                fields=['updated_at'],
+                name='webapp_item_active_updated',
+                condition=models.Q(archived_at__isnull=True),
+            ),
+            # アーカイブ済みのアイテムの一覧用
+            models.Index(
+                fields=['owner', '-archived_at'],
+                name='webapp_item_archived',
+                condition=models.Q(archived_at__isnull=False),
+            ),
+        ]
+
+
+class Task(models.Model):
+    """
+    バックグラウンドタスクモデル
+    """
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_QUEUED, '待機中'),
+        (STATUS_RUNNING, '実行中'),
+        (STATUS_FAILED, '失敗'),
+    )
+
+    name = models.CharField(
+        verbose_name='タスク名',
+        max_length=200,
+    )
+    args = models.TextField(
+        verbose_name='引数',
+        default='[]',
+    )
+    kwargs = models.TextField(
+        verbose_name='キーワード引数',
+        default='{}',
+    )
+    priority = models.IntegerField(
+        verbose_name='優先度',
+        default=0,
+    )
+    status = models.CharField(
+        verbose_name='状態',
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=STATUS_QUEUED,
+    )
+    attempts = models.IntegerField(
+        verbose_name='試行回数',
+        default=0,
+    )
+    max_attempts = models.IntegerField(
+        verbose_name='最大試行回数',
+        default=3,
+    )
+    run_at = models.DateTimeField(
+        verbose_name='実行予定日時',
+        default=timezone.now,
+    )
+    last_error = models.TextField(
+        verbose_name='エラー内容',
+        blank=True,
+    )
+    created_at = models.DateTimeField(
+        verbose_name='作成日時',
+        auto_now_add=True,
+    )
+    updated_at = models.DateTimeField(
+        verbose_name='更新日時',
+        auto_now=True,
+    )
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        verbose_name = 'タスク'
+        verbose_name_plural = 'タスク'
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='webapp_task_status_run_at'),
+        ]
 
 @receiver(models.signals.pre_save, sender=Item)
 def item_pre_save(sender, instance, **kwargs):
-    # アイテムの保存時に古い画像ファイルを削除
+    # アイテムの保存時に古い画像ファイルを削除し、オーナーの画像の使用容量の増減を計算
+    from . import tasks
+    instance._media_delta = 0
+    if not instance.image:
+        instance.image_size = 0
+    elif not instance.image._committed:
+        instance.image_size = instance.image.size
+        instance._media_delta += instance.image_size
     if instance.pk:
         try:
-            item = Item.objects.get(pk=instance.pk)
+            item = Item.all_objects.get(pk=instance.pk, owner_id=instance.owner_id)
             if item.image:
                 if item.image != instance.image:
-                    item.image.delete(False)
+                    tasks.enqueue(tasks.delete_files, [item.image.name])
+                    instance._media_delta -= released_image_size(item)
         except Item.DoesNotExist:
             pass
 
-@receiver(models.signals.post_delete, sender=Item)
-def item_post_delete(sender, instance, **kwargs):
-    # アイテムの削除時に画像ファイルを削除
-    if instance.image:
-        instance.image.delete(False)
+@receiver(models.signals.post_save, sender=Item)
+def item_post_save(sender, instance, **kwargs):
+    # オーナーの画像の使用容量を更新（保存と同じトランザクション）
+    # 増える場合は上限を超えないときだけ更新し、超える場合は保存を失敗させる
+    delta = getattr(instance, '_media_delta', 0)
+    if delta:
+        users = User.objects.filter(pk=instance.owner_id)
+        quota = getattr(settings, 'MEDIA_QUOTA_BYTES', None)
+        if delta > 0 and quota is not None:
+            users = users.filter(media_bytes__lte=quota - delta)
+        updated = users.update(media_bytes=models.F('media_bytes') + delta)
+        instance._media_delta = 0
+        if not updated and delta > 0 and quota is not None:
+            raise MediaQuotaExceeded()
+
+@receiver(models.signals.pre_save, sender=Item)
+def item_set_excerpt(sender, instance, **kwargs):
+    # 一覧用の説明の抜粋を設定
+    instance.excerpt = make_excerpt(instance.description)
+
+@receiver(models.signals.post_save, sender=Category)
+def category_set_path(sender, instance, **kwargs):
+    # 追加時・親カテゴリの変更時に経路を設定（子孫の経路も書き換える）
+    if instance.path != category_path(instance.parent, instance.pk):
+        if instance.path:
+            move_category(instance, instance.parent)
+        else:
+            instance.path = category_path(instance.parent, instance.pk)
+            instance.depth = instance.parent.depth + 1 if instance.parent else 0
+            Category.objects.filter(pk=instance.pk).update(path=instance.path, depth=instance.depth)
+
+@receiver(models.signals.post_save, sender=Category)
+@receiver(models.signals.post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    # カテゴリの追加・変更・削除時にキャッシュを削除
+    from . import caches
+    caches.invalidate_categories(instance.owner_id)
@@ -0,0 +1,88 @@
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+class CountFreePaginator(Paginator):
+    """
+    件数を数えないページネーター
+    （1件多く取得して次のページの有無を判定する）
+    """
+    count = None
+    num_pages = None
+
+    def validate_number(self, number):
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        object_list = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not object_list and number > 1:
+            raise EmptyPage('That page contains no results')
+        has_next = len(object_list) > self.per_page
+        return CountFreePage(object_list[:self.per_page], number, self, has_next)
+
+
+class CountFreePage(Page):
+    """
+    件数を数えないページ
+    """
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def __repr__(self):
+        return '<Page %s>' % self.number
+
+    def has_next(self):
+        return self._has_next
+
+    def start_index(self):
+        if not self.object_list:
+            return 0
+        return (self.paginator.per_page * (self.number - 1)) + 1
+
+    def end_index(self):
+        return self.start_index() + len(self.object_list) - 1 if self.object_list else 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    絞り込みのない大きなテーブルの件数を統計情報（pg_class.reltuples）の推定値で済ませるページネーター
+    """
+    # 推定値がこれより少ない場合は正確な件数を数える
+    exact_count_threshold = 10000
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is None or query.where:
+            return super().count
+        estimate = self._estimate(self.object_list.db, self.object_list.model._meta.db_table)
+        if estimate is None or estimate < self.exact_count_threshold:
+            return super().count
+        return estimate
+
+    def _estimate(self, using, table):
+        connection = connections[using]
+        if connection.vendor != 'postgresql':
+            return None
+        # パーティション分割されたテーブルは子テーブルの合計
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT SUM(GREATEST(c.reltuples, 0)) FROM pg_class c '
+                'WHERE c.oid = %s::regclass '
+                'OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass)',
+                [table, table],
+            )
+            row = cursor.fetchone()
+        return int(row[0]) if row and row[0] is not None else None
@@ -0,0 +1,100 @@
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+
+def allow(scope, key, consume=True):
+    """
+    トークンバケットからトークンを1つ取り出す（取り出せなければFalse）
+    （consume=Falseの場合は取り出せるかどうかだけを確認する）
+    """
+    capacity, period = getattr(settings, 'RATELIMITS', {}).get(scope, (None, None))
+    if capacity is None:
+        return True
+    rate = capacity / period
+    cache_key = 'webapp:ratelimit:{}:{}'.format(scope, key)
+
+    # 前回からの経過時間分のトークンを補充する
+    # （複数プロセスで同時に更新すると多少ずれるが、大量のリクエストを抑える目的には十分）
+    now = time.time()
+    bucket = cache.get(cache_key)
+    if bucket is None:
+        tokens = capacity
+    else:
+        tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+    allowed = tokens >= 1
+    if allowed and consume:
+        tokens -= 1
+        cache.set(cache_key, (tokens, now), int(period) + 1)
+    return allowed
+
+
+def client_ip(request):
+    """
+    リクエスト元のIPアドレスを返す
+    """
+    header = getattr(settings, 'RATELIMIT_IP_HEADER', None)
+    if header and header in request.META:
+        return request.META[header].split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def too_many_requests(scope):
+    """
+    429レスポンスを返す
+    """
+    capacity, period = settings.RATELIMITS[scope]
+    response = HttpResponse('リクエストが多すぎます。しばらくしてから再度お試しください。', status=429)
+    response['Retry-After'] = str(max(1, int(period / capacity)))
+    return response
+
+
+def posted_email(request, email_field):
+    """
+    入力されたメールアドレスを正規化して返す
+    """
+    return request.POST.get(email_field, '').strip().lower()
+
+
+def check(request, scope, email_scope=None, email_field=None, consume_email=True):
+    """
+    IPアドレスと入力されたメールアドレスごとの制限を確認する（超えた場合は429レスポンスを返す）
+    """
+    if not allow(scope, 'ip:' + client_ip(request)):
+        return too_many_requests(scope)
+    if email_scope and email_field:
+        email = posted_email(request, email_field)
+        if email and not allow(email_scope, 'email:' + email, consume_email):
+            return too_many_requests(email_scope)
+    return None
+
+
+class RateLimitMixin:
+    """
+    IPアドレスと入力されたメールアドレスごとにリクエスト数を制限する
+    （パスワードのハッシュ化やデータベースへのアクセスより前に確認する）
+    """
+    ratelimit_scope = None
+    ratelimit_methods = None
+    ratelimit_email_scope = None
+    ratelimit_email_field = None
+    # Trueの場合はメールアドレスごとのトークンを入力エラー（ログインの失敗など）のときだけ取り出す
+    ratelimit_email_on_invalid = False
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.ratelimit_methods is None or request.method in self.ratelimit_methods:
+            response = check(
+                request, self.ratelimit_scope, self.ratelimit_email_scope, self.ratelimit_email_field,
+                consume_email=not self.ratelimit_email_on_invalid,
+            )
+            if response is not None:
+                return response
+        return super().dispatch(request, *args, **kwargs)
+
+    def form_invalid(self, form):
+        if self.ratelimit_email_on_invalid and self.ratelimit_email_scope:
+            email = posted_email(self.request, self.ratelimit_email_field)
+            if email:
+                allow(self.ratelimit_email_scope, 'email:' + email)
+        return super().form_invalid(form)
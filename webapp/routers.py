@@ -0,0 +1,41 @@
+import random
+import threading
+from contextlib import contextmanager
+from django.conf import settings
+
+_state = threading.local()
+
+
+@contextmanager
+def replica_reads():
+    """
+    このブロック内の読み込みをリードレプリカに振り分ける
+    """
+    previous = getattr(_state, 'use_replica', False)
+    _state.use_replica = True
+    try:
+        yield
+    finally:
+        _state.use_replica = previous
+
+
+class ReplicaRouter:
+    """
+    リードレプリカへの振り分けを行うデータベースルーター
+    """
+    def db_for_read(self, model, **hints):
+        # replica_reads()の中でのwebappのモデルの読み込みのみレプリカを使う
+        replicas = getattr(settings, 'REPLICA_DATABASES', [])
+        if replicas and getattr(_state, 'use_replica', False) and model._meta.app_label == 'webapp':
+            return random.choice(replicas)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # レプリカはdefaultの複製なので同一データベースとして扱う
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in getattr(settings, 'REPLICA_DATABASES', [])
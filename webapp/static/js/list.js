@@ -0,0 +1,148 @@
+/*
+ * 一覧ページの並び替え・削除・説明の読み込みをページ全体を再読み込みせずに行う
+ * （スクリプトが使えない場合は通常のフォーム送信・削除ページになる）
+ */
+(function () {
+  'use strict';
+
+  var form = document.querySelector('form[data-fragment-list]');
+  if (!form || !window.fetch || !window.FormData) {
+    return;
+  }
+
+  function post(url, body) {
+    return fetch(url, {
+      method: 'POST',
+      body: body,
+      credentials: 'same-origin',
+      headers: { 'X-Requested-With': 'XMLHttpRequest' }
+    }).then(function (response) {
+      if (!response.ok && response.status !== 409) {
+        throw new Error(response.status);
+      }
+      return response.json();
+    });
+  }
+
+  function get(url) {
+    return fetch(url, {
+      credentials: 'same-origin',
+      headers: { 'X-Requested-With': 'XMLHttpRequest' }
+    }).then(function (response) {
+      if (!response.ok) {
+        throw new Error(response.status);
+      }
+      return response.text();
+    });
+  }
+
+  function findCard(pk) {
+    return form.querySelector('[data-pk="' + pk + '"]');
+  }
+
+  function parseCard(html) {
+    var template = document.createElement('template');
+    template.innerHTML = html.trim();
+    return template.content.firstChild;
+  }
+
+  // 最初・最後の上下ボタンを無効にする
+  function updateEdges(data) {
+    Array.prototype.forEach.call(form.querySelectorAll('button[name="up"]'), function (button) {
+      button.disabled = button.value === String(data.first_pk);
+    });
+    Array.prototype.forEach.call(form.querySelectorAll('button[name="down"]'), function (button) {
+      button.disabled = button.value === String(data.last_pk);
+    });
+  }
+
+  function showMessage(text, tag) {
+    var container = document.getElementById('messages');
+    var alert = document.createElement('div');
+    var paragraph = document.createElement('p');
+    alert.className = 'alert alert-' + tag;
+    paragraph.className = 'mb-0';
+    paragraph.textContent = text;
+    alert.appendChild(paragraph);
+    container.innerHTML = '';
+    container.appendChild(alert);
+  }
+
+  // 並び替えたカードを差し替える（ページ外へ移動したカードは入れ替わったカードで置き換える）
+  function swapCards(cards) {
+    var present = cards.filter(function (card) { return findCard(card.pk); });
+    if (present.length === cards.length) {
+      var nodes = cards.map(function (card) { return findCard(card.pk); });
+      if (nodes[1].compareDocumentPosition(nodes[0]) & Node.DOCUMENT_POSITION_FOLLOWING) {
+        nodes.reverse();
+      }
+      nodes.forEach(function (node, index) {
+        node.replaceWith(parseCard(cards[index].html));
+      });
+    } else if (present.length === 1) {
+      var absent = cards.filter(function (card) { return card !== present[0]; })[0];
+      findCard(present[0].pk).replaceWith(parseCard(absent.html));
+    }
+  }
+
+  function fallback(button) {
+    var input = document.createElement('input');
+    input.type = 'hidden';
+    input.name = button.name;
+    input.value = button.value;
+    form.appendChild(input);
+    form.submit();
+  }
+
+  form.addEventListener('click', function (event) {
+    var button = event.target.closest('button[name="up"], button[name="down"]');
+    if (button) {
+      event.preventDefault();
+      var body = new FormData(form);
+      body.append(button.name, button.value);
+      post(form.action, body).then(function (data) {
+        if (data.error) {
+          showMessage(data.error, 'danger');
+          return;
+        }
+        swapCards(data.cards);
+        updateEdges(data);
+      }).catch(function () {
+        fallback(button);
+      });
+      return;
+    }
+
+    // カードの説明・画像を読み込む
+    var expand = event.target.closest('a[data-expand]');
+    if (expand) {
+      event.preventDefault();
+      get(expand.href).then(function (html) {
+        expand.closest('[data-body]').replaceWith(parseCard(html));
+      }).catch(function () {
+        window.location.href = expand.href;
+      });
+      return;
+    }
+
+    var link = event.target.closest('a[data-delete]');
+    if (link) {
+      event.preventDefault();
+      if (!window.confirm(link.dataset.delete)) {
+        return;
+      }
+      var token = new FormData();
+      token.append('csrfmiddlewaretoken', form.elements.csrfmiddlewaretoken.value);
+      post(link.href, token).then(function (data) {
+        var card = findCard(data.deleted);
+        if (card) {
+          card.remove();
+        }
+        updateEdges(data);
+        showMessage(data.message, 'success');
+      }).catch(function () {
+        window.location.href = link.href;
+      });
+    }
+  });
+})();
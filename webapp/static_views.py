@@ -0,0 +1,51 @@
+import mimetypes
+import os
+import re
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+# ManifestStaticFilesStorageが付けるハッシュ（例: bundle.0123456789ab.css）
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.')
+
+# Accept-Encodingで選ぶ圧縮済みファイル（優先順）
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def serve(request, path):
+    """
+    STATIC_ROOTのファイルを配信する
+    （圧縮済みのファイルがあればそちらを返し、ハッシュ付きのファイル名は長期間キャッシュさせる）
+    """
+    try:
+        fullpath = safe_join(settings.STATIC_ROOT, path)
+    except ValueError:
+        raise Http404
+    if not os.path.isfile(fullpath):
+        raise Http404
+
+    content_type, _ = mimetypes.guess_type(fullpath)
+    encoding = None
+    accept = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    for name, suffix in ENCODINGS:
+        if re.search(r'\b{}\b'.format(name), accept) and os.path.isfile(fullpath + suffix):
+            encoding = name
+            fullpath += suffix
+            break
+
+    stat = os.stat(fullpath)
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime, stat.st_size):
+        return HttpResponseNotModified()
+
+    response = FileResponse(open(fullpath, 'rb'), content_type=content_type or 'application/octet-stream')
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Vary'] = 'Accept-Encoding'
+    if encoding:
+        response['Content-Encoding'] = encoding
+    if HASHED_NAME_RE.search(os.path.basename(path)):
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response['Cache-Control'] = 'public, max-age=3600'
+    return response
@@ -0,0 +1,267 @@
+import json
+import logging
+import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.core import mail
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import User, Category, Item, Task
+
+logger = logging.getLogger(__name__)
+
+# タスク名 → 関数
+registry = {}
+
+
+def task(func):
+    """
+    関数をタスクとして登録するデコレータ
+    """
+    registry[func.__name__] = func
+    return func
+
+
+def enqueue(func, *args, priority=0, run_at=None, max_attempts=None, **kwargs):
+    """
+    タスクを登録する（トランザクションのコミット後に登録される）
+    """
+    name = func.__name__
+    if name not in registry:
+        raise ValueError('Unregistered task: {}'.format(name))
+
+    def _enqueue():
+        # 同期実行モード（テスト用）
+        # 実行予定日時が未来のタスク（定期実行の次回分）は実行しない
+        if getattr(settings, 'TASK_ALWAYS_EAGER', False):
+            if run_at is None or run_at <= timezone.now():
+                registry[name](*args, **kwargs)
+            return
+        Task.objects.create(
+            name=name,
+            args=json.dumps(args),
+            kwargs=json.dumps(kwargs),
+            priority=priority,
+            run_at=run_at or timezone.now(),
+            max_attempts=max_attempts or getattr(settings, 'TASK_MAX_ATTEMPTS', 3),
+        )
+
+    transaction.on_commit(_enqueue)
+
+
+def claim():
+    """
+    実行可能なタスクを1件取得してロックする
+    """
+    lease_seconds = getattr(settings, 'TASK_LEASE_SECONDS', 60*5)
+    now = timezone.now()
+    with transaction.atomic():
+        # 他のワーカーがロック中の行はスキップする
+        # 実行中のまま期限を過ぎたタスク（ワーカーの異常終了）も再取得する
+        task = Task.objects.select_for_update(skip_locked=True).filter(
+            status__in=[Task.STATUS_QUEUED, Task.STATUS_RUNNING],
+            run_at__lte=now,
+        ).order_by('-priority', 'run_at').first()
+        if task is None:
+            return None
+        Task.objects.filter(pk=task.pk).update(
+            status=Task.STATUS_RUNNING,
+            attempts=F('attempts') + 1,
+            run_at=now + timedelta(seconds=lease_seconds),
+        )
+        task.attempts += 1
+        return task
+
+
+def run(task):
+    """
+    タスクを実行する（成功したら削除、失敗したら再試行 or 失敗状態にする）
+    """
+    try:
+        func = registry[task.name]
+        func(*json.loads(task.args), **json.loads(task.kwargs))
+
+    except Exception:
+        logger.exception('Task %s (%s) failed', task.pk, task.name)
+        if task.attempts >= task.max_attempts:
+            status = Task.STATUS_FAILED
+            run_at = timezone.now()
+        else:
+            # 試行回数に応じて間隔を空けて再試行
+            status = Task.STATUS_QUEUED
+            delay = getattr(settings, 'TASK_RETRY_DELAY_SECONDS', 60) * 2 ** (task.attempts - 1)
+            run_at = timezone.now() + timedelta(seconds=delay)
+        Task.objects.filter(pk=task.pk).update(
+            status=status,
+            run_at=run_at,
+            last_error=traceback.format_exc(),
+        )
+        return False
+
+    else:
+        Task.objects.filter(pk=task.pk).delete()
+        return True
+
+
+@task
+def delete_files(names):
+    """
+    ストレージのファイルを削除する
+    （カテゴリの複製で共有している画像は、参照しているアイテムが残っている場合は削除しない）
+    """
+    shared = set(Item.all_objects.filter(image__in=names).values_list('image', flat=True))
+    for name in names:
+        if name not in shared:
+            default_storage.delete(name)
+
+
+@task
+def send_mail(subject, message, recipient_list):
+    """
+    メールを送信する
+    """
+    mail.send_mail(subject, message, None, recipient_list)
+
+
+@task
+def purge_user(user_pk):
+    """
+    論理削除したユーザーのデータを一定件数ずつ物理削除する
+    """
+    if not User.objects.filter(pk=user_pk, deleted_at__isnull=False).exists():
+        return
+    batch_size = getattr(settings, 'PURGE_BATCH_SIZE', 1000)
+
+    with transaction.atomic():
+        # アイテム → カテゴリの順に削除（シグナルを発行しないSQLで削除）
+        rows = list(Item.all_objects.filter(owner_id=user_pk).values_list('pk', 'image')[:batch_size])
+        if rows:
+            _delete_rows(Item, user_pk, [pk for pk, image in rows])
+            images = [image for pk, image in rows if image]
+            if images:
+                enqueue(delete_files, images)
+        else:
+            # 子カテゴリが残ったまま親カテゴリを削除しないように深い階層から削除する
+            pks = list(Category.objects.filter(owner_id=user_pk).order_by('-depth').values_list('pk', flat=True)[:batch_size])
+            if pks:
+                _delete_rows(Category, user_pk, pks)
+            else:
+                # 関連データがなくなったのでユーザーを削除
+                User.objects.filter(pk=user_pk).delete()
+                return
+
+        # 残りは次のタスクで削除
+        enqueue(purge_user, user_pk, priority=-1)
+
+
+def stale_inactive_users():
+    """
+    仮登録のまま有効期限が切れたユーザー
+    """
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'ACTIVATION_TIMEOUT_SECONDS', 60*60*24))
+    return User.objects.filter(
+        is_active=False,
+        last_login__isnull=True,
+        date_joined__lt=cutoff,
+        deleted_at__isnull=True,
+    )
+
+
+def purge_inactive_users_batch():
+    """
+    仮登録のまま有効期限が切れたユーザーを一定件数削除して、削除した件数を返す
+    """
+    batch_size = getattr(settings, 'PURGE_BATCH_SIZE', 1000)
+    with transaction.atomic():
+        pks = list(stale_inactive_users().values_list('pk', flat=True)[:batch_size])
+        if pks:
+            # 取得後に本登録・ログインしたユーザーを削除しないように条件を付け直す
+            stale_inactive_users().filter(pk__in=pks).delete()
+    return len(pks)
+
+
+@task
+def purge_inactive_users():
+    """
+    仮登録のまま有効期限が切れたユーザーを削除する（定期実行）
+    """
+    # 残りがあればすぐに、なければ一定時間後に再実行する
+    if purge_inactive_users_batch() < getattr(settings, 'PURGE_BATCH_SIZE', 1000):
+        run_at = timezone.now() + timedelta(seconds=getattr(settings, 'PURGE_INACTIVE_USERS_INTERVAL', 60*60))
+    else:
+        run_at = None
+    enqueue(purge_inactive_users, priority=-1, run_at=run_at)
+
+
+def stale_items(days=None):
+    """
+    一定日数更新されていないアーカイブ対象のアイテム
+    """
+    if days is None:
+        days = getattr(settings, 'ITEM_ARCHIVE_DAYS', 365)
+    cutoff = timezone.now() - timedelta(days=days)
+    return Item.objects.filter(updated_at__lt=cutoff)
+
+
+def archive_items_batch(days=None):
+    """
+    アーカイブ対象のアイテムを一定件数アーカイブして、アーカイブした件数を返す
+    """
+    batch_size = getattr(settings, 'ITEM_ARCHIVE_BATCH_SIZE', 1000)
+    with transaction.atomic():
+        rows = list(stale_items(days).order_by('updated_at').values_list('pk', 'owner_id')[:batch_size])
+        if rows:
+            # 編集中の画面は競合として検出される
+            # オーナーも指定して対象のオーナーのパーティションだけを更新する
+            Item.objects.filter(
+                owner_id__in={owner_pk for pk, owner_pk in rows},
+                pk__in=[pk for pk, owner_pk in rows],
+            ).update(
+                archived_at=timezone.now(),
+                version=F('version') + 1,
+            )
+    return len(rows)
+
+
+@task
+def archive_items():
+    """
+    一定日数更新されていないアイテムをアーカイブする（定期実行）
+    """
+    # 残りがあればすぐに、なければ一定時間後に再実行する
+    if archive_items_batch() < getattr(settings, 'ITEM_ARCHIVE_BATCH_SIZE', 1000):
+        run_at = timezone.now() + timedelta(seconds=getattr(settings, 'ITEM_ARCHIVE_INTERVAL', 60*60*24))
+    else:
+        run_at = None
+    enqueue(archive_items, priority=-1, run_at=run_at)
+
+
+def schedule(func, **kwargs):
+    """
+    定期実行するタスクが登録されていなければ登録する
+    """
+    queued = Task.objects.filter(
+        name=func.__name__,
+        status__in=[Task.STATUS_QUEUED, Task.STATUS_RUNNING],
+    ).exists()
+    if not queued:
+        enqueue(func, **kwargs)
+    return not queued
+
+
+def _delete_rows(model, owner_pk, pks):
+    """
+    オーナーと主キーを指定して行を削除する
+    （オーナーの指定でパーティションを絞り込む）
+    """
+    quote_name = connection.ops.quote_name
+    sql = 'DELETE FROM {} WHERE {} = %s AND {} IN ({})'.format(
+        quote_name(model._meta.db_table),
+        quote_name(model._meta.get_field('owner').column),
+        quote_name(model._meta.pk.column),
+        ', '.join(['%s'] * len(pks)),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [owner_pk] + pks)
@@ -1,6 +1,17 @@
 from django import template
+from django.utils.html import format_html
 register = template.Library()
 
+# 使用するマテリアルアイコンのSVGパス
+ICONS = {
+    'add': 'M19 13h-6v6h-2v-6H5v-2h6V5h2v6h6v2z',
+    'arrow_downward': 'M20 12l-1.41-1.41L13 16.17V4h-2v12.17l-5.58-5.59L4 12l8 8 8-8z',
+    'arrow_upward': 'M4 12l1.41 1.41L11 7.83V20h2V7.83l5.58 5.59L20 12l-8-8-8 8z',
+    'content_copy': 'M16 1H4c-1.1 0-2 .9-2 2v14h2V3h12V1zm3 4H8c-1.1 0-2 .9-2 2v14c0 1.1.9 2 2 2h11c1.1 0 2-.9 2-2V7c0-1.1-.9-2-2-2zm0 16H8V7h11v14z',
+    'clear': 'M19 6.41L17.59 5 12 10.59 6.41 5 5 6.41 10.59 12 5 17.59 6.41 19 12 13.41 17.59 19 19 17.59 13.41 12z',
+    'edit': 'M3 17.25V21h3.75L17.81 9.94l-3.75-3.75L3 17.25zM20.71 7.04c.39-.39.39-1.02 0-1.41l-2.34-2.34c-.39-.39-1.02-.39-1.41 0l-1.83 1.83 3.75 3.75 1.83-1.83z',
+}
+
 
 @register.simple_tag
 def replace_query(request, field, value):
@@ -10,3 +21,55 @@ def replace_query(request, field, value):
     get_dict = request.GET.copy()
     get_dict[field] = value
     return get_dict.urlencode()
+
+
+@register.simple_tag
+def icon(name):
+    """
+    マテリアルアイコンをインラインのSVGで表示する
+    """
+    return format_html(
+        '<svg class="icon" viewBox="0 0 24 24" width="24" height="24" aria-hidden="true"><path d="{}"/></svg>',
+        ICONS[name],
+    )
+
+
+@register.inclusion_tag('pagination.html', takes_context=True)
+def pager(context, window=2):
+    """
+    ページネーションを表示する（表示するページ番号だけを計算する）
+    """
+    request = context['request']
+    page_obj = context['page_obj']
+    number = page_obj.number
+    num_pages = page_obj.paginator.num_pages
+
+    # ページ番号以外のGETパラメータは一度だけ組み立てる
+    get_dict = request.GET.copy()
+    get_dict.pop('page', None)
+    query = get_dict.urlencode()
+    prefix = '?{}&page='.format(query) if query else '?page='
+
+    # 先頭・現在のページの前後・最後のページを表示する
+    # 件数を数えないページネーターの場合は最後のページの代わりに次のページまで表示する
+    if num_pages is None:
+        last = number + 1 if page_obj.has_next() else number
+        numbers = {1} | set(range(max(1, number - window), last + 1))
+    else:
+        numbers = {1, num_pages} | set(range(max(1, number - window), min(num_pages, number + window) + 1))
+
+    # 間が空く箇所は省略記号（None）にする
+    pages = []
+    previous = 0
+    for page in sorted(numbers):
+        if page > previous + 1:
+            pages.append((None, None))
+        pages.append((page, prefix + str(page)))
+        previous = page
+
+    return {
+        'number': number,
+        'pages': pages,
+        'previous_url': prefix + str(number - 1) if page_obj.has_previous() else None,
+        'next_url': prefix + str(number + 1) if page_obj.has_next() else None,
+    }
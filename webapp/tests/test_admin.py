@@ -0,0 +1,49 @@
+from unittest import mock
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from webapp.models import User, Item, Task
+from webapp.paginators import EstimatedCountPaginator
+
+
+class AdminTests(TestCase):
+    """
+    管理サイトの一覧（検索・絞り込み・件数）
+    """
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin@example.com', 'password')
+        self.client.force_login(self.admin)
+        self.user = User.objects.create_user('user@example.com', 'password')
+        self.active = Item.objects.create(owner=self.user, title='active', mark=1)
+        self.archived = Item.all_objects.create(owner=self.user, title='archived', mark=1, archived_at=timezone.now())
+        Item.objects.create(owner=self.admin, title='admin', mark=1)
+
+    def changelist(self, model, **params):
+        url = reverse('admin:webapp_{}_changelist'.format(model._meta.model_name))
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.context['cl']
+
+    def test_search_by_exact_email(self):
+        cl = self.changelist(Item, q='user@example.com')
+        self.assertEqual(set(cl.queryset), {self.active, self.archived})
+        # 大文字・小文字を区別する完全一致（iexactではない）
+        self.assertEqual(list(self.changelist(Item, q='USER@example.com').queryset), [])
+        self.assertEqual(list(self.changelist(Item, q='user@example').queryset), [])
+
+    def test_archived_filter(self):
+        self.assertEqual(list(self.changelist(Item, archived='1').queryset), [self.archived])
+        self.assertEqual(set(self.changelist(Item, archived='0').queryset), {self.active, Item.objects.get(title='admin')})
+
+    def test_task_status_filter(self):
+        Task.objects.create(name='a', status=Task.STATUS_FAILED)
+        Task.objects.create(name='b', status=Task.STATUS_QUEUED)
+        self.assertEqual([task.name for task in self.changelist(Task, status=Task.STATUS_FAILED).queryset], ['a'])
+
+    def test_estimated_count(self):
+        # 絞り込みがなければ統計情報の推定値を使う
+        with mock.patch.object(EstimatedCountPaginator, '_estimate', return_value=50000):
+            self.assertEqual(self.changelist(Item).paginator.count, 50000)
+            self.assertEqual(self.changelist(Item, archived='1').paginator.count, 1)
+        # 推定値を取得できなければ数える
+        self.assertEqual(self.changelist(Item).paginator.count, 3)
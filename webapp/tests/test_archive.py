@@ -0,0 +1,49 @@
+from datetime import timedelta
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from webapp import tasks
+from webapp.models import User, Item
+
+
+class ItemArchiveTests(TestCase):
+    """
+    アイテムのアーカイブ・元に戻す
+    """
+    def setUp(self):
+        self.user = User.objects.create_user('user@example.com', 'password')
+        self.client.force_login(self.user)
+        self.old = Item.objects.create(owner=self.user, title='old', mark=1)
+        self.new = Item.objects.create(owner=self.user, title='new', mark=1)
+        Item.objects.filter(pk=self.old.pk).update(updated_at=timezone.now() - timedelta(days=400))
+
+    @override_settings(ITEM_ARCHIVE_DAYS=365)
+    def test_archive_stale_items(self):
+        self.assertEqual(tasks.archive_items_batch(), 1)
+        self.assertEqual(list(Item.objects.all()), [self.new])
+        archived = Item.all_objects.get(pk=self.old.pk)
+        self.assertIsNotNone(archived.archived_at)
+        self.assertEqual(archived.version, self.old.version + 1)
+        self.assertEqual(tasks.archive_items_batch(), 0)
+
+        response = self.client.get(reverse('webapp:item_archive'))
+        self.assertEqual(list(response.context['item_list']), [archived])
+
+    def test_restore_to_the_top(self):
+        Item.objects.filter(pk=self.old.pk).update(archived_at=timezone.now())
+        response = self.client.post(reverse('webapp:item_archive'), {'restore': self.old.pk})
+        self.assertRedirects(response, reverse('webapp:item_archive'))
+        self.old.refresh_from_db()
+        self.new.refresh_from_db()
+        self.assertIsNone(self.old.archived_at)
+        self.assertEqual(self.old.order, 0)
+        self.assertEqual(self.new.order, 1)
+
+    def test_restore_invalid_item(self):
+        other = User.objects.create_user('other@example.com', 'password')
+        item = Item.all_objects.create(owner=other, title='other', mark=1, archived_at=timezone.now())
+        for value in ('abc', '', self.new.pk, item.pk):
+            response = self.client.post(reverse('webapp:item_archive'), {'restore': value})
+            self.assertEqual(response.status_code, 404)
+        response = self.client.post(reverse('webapp:item_archive'))
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,71 @@
+from django.test import TestCase
+from django.urls import reverse
+from webapp.models import User, Category
+
+
+class CategoryTreeTests(TestCase):
+    """
+    カテゴリの階層（経路・移動・循環の拒否）
+    """
+    def setUp(self):
+        self.user = User.objects.create_user('user@example.com', 'password')
+        self.client.force_login(self.user)
+        self.root = Category.objects.create(owner=self.user, name='root')
+        self.child = Category.objects.create(owner=self.user, name='child', parent=self.root)
+        self.leaf = Category.objects.create(owner=self.user, name='leaf', parent=self.child)
+        self.other = Category.objects.create(owner=self.user, name='other')
+
+    def update_category(self, category, parent):
+        category.refresh_from_db()
+        return self.client.post(reverse('webapp:category_update', args=[category.pk]), {
+            'name': category.name,
+            'parent': parent.pk if parent else '',
+            'version': category.version,
+        })
+
+    def test_path_and_depth(self):
+        self.leaf.refresh_from_db()
+        self.assertEqual(self.leaf.path, '/{}/{}/{}/'.format(self.root.pk, self.child.pk, self.leaf.pk))
+        self.assertEqual(self.leaf.depth, 2)
+        self.assertEqual(self.leaf.ancestor_pks(), [self.root.pk, self.child.pk])
+        self.assertEqual(set(self.root.subtree()), {self.root, self.child, self.leaf})
+
+    def test_move_subtree(self):
+        response = self.update_category(self.child, self.other)
+        self.assertEqual(response.status_code, 302)
+        self.child.refresh_from_db()
+        self.leaf.refresh_from_db()
+        self.assertEqual(self.child.parent, self.other)
+        self.assertEqual(self.leaf.path, '/{}/{}/{}/'.format(self.other.pk, self.child.pk, self.leaf.pk))
+        self.assertEqual(self.leaf.depth, 2)
+        self.assertEqual(set(self.root.subtree()), {self.root})
+
+    def test_move_to_root(self):
+        self.assertEqual(self.update_category(self.child, None).status_code, 302)
+        self.leaf.refresh_from_db()
+        self.assertEqual(self.leaf.path, '/{}/{}/'.format(self.child.pk, self.leaf.pk))
+        self.assertEqual(self.leaf.depth, 1)
+
+    def test_cycle_is_rejected(self):
+        for parent in (self.root, self.leaf):
+            response = self.update_category(self.root, parent)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.context['form'].errors['parent'])
+        self.root.refresh_from_db()
+        self.assertIsNone(self.root.parent)
+
+    def test_non_numeric_parent_is_not_found(self):
+        response = self.client.get(reverse('webapp:category_list'), {'parent': 'abc'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_delete_returns_sibling_edges(self):
+        sibling = Category.objects.create(owner=self.user, name='sibling', parent=self.root, order=1)
+        last = Category.objects.create(owner=self.user, name='last', parent=self.root, order=2)
+        response = self.client.post(
+            reverse('webapp:category_delete', args=[sibling.pk]),
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+        self.assertEqual(response.json()['deleted'], sibling.pk)
+        # ルートの階層ではなく、削除したカテゴリと同じ階層の最初・最後
+        self.assertEqual(response.json()['first_pk'], self.child.pk)
+        self.assertEqual(response.json()['last_pk'], last.pk)
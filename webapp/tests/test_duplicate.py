@@ -0,0 +1,57 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from webapp.models import User, Category, Item
+
+
+class CategoryDuplicateTests(TestCase):
+    """
+    カテゴリの複製（INSERT ... SELECTによるアイテムの複製）
+    """
+    def setUp(self):
+        self.user = User.objects.create_user('user@example.com', 'password')
+        self.client.force_login(self.user)
+        self.source = Category.objects.create(owner=self.user, name='source')
+        self.child = Category.objects.create(owner=self.user, name='child', parent=self.source)
+        self.leaf = Category.objects.create(owner=self.user, name='leaf', parent=self.child)
+        for i in range(2):
+            Item.objects.create(owner=self.user, category=self.source, title='item{}'.format(i), mark=1, order=i)
+        Item.objects.create(owner=self.user, category=self.leaf, title='leaf item', mark=1)
+        Item.all_objects.create(owner=self.user, category=self.source, title='archived', mark=1, archived_at=timezone.now())
+
+    def duplicate(self, parent=None):
+        return self.client.post(reverse('webapp:category_duplicate', args=[self.source.pk]), {
+            'name': 'copy',
+            'parent': parent.pk if parent else '',
+        })
+
+    def test_page_shows_subtree_counts(self):
+        response = self.client.get(reverse('webapp:category_duplicate', args=[self.source.pk]))
+        self.assertEqual(response.context['descendant_count'], 2)
+        self.assertEqual(response.context['item_count'], 3)
+
+    def test_duplicate_subtree(self):
+        self.assertEqual(self.duplicate().status_code, 302)
+        copy = Category.objects.get(name='copy')
+        self.assertEqual(copy.order, 0)
+        items = Item.objects.filter(category=copy).order_by('order')
+        self.assertEqual([(item.title, item.order, item.version) for item in items], [('item0', 0, 0), ('item1', 1, 0)])
+        self.assertFalse(Item.all_objects.filter(category=copy, title='archived').exists())
+
+        # 子孫のカテゴリとそのアイテムも複製される
+        child = Category.objects.get(parent=copy)
+        leaf = Category.objects.get(parent=child)
+        self.assertEqual((child.name, leaf.name), ('child', 'leaf'))
+        self.assertEqual(leaf.path, '/{}/{}/{}/'.format(copy.pk, child.pk, leaf.pk))
+        self.assertEqual(leaf.depth, 2)
+        self.assertEqual(list(Item.objects.filter(category=leaf).values_list('title', flat=True)), ['leaf item'])
+        # 複製元は変わらない
+        self.assertEqual(Item.objects.filter(category=self.source).count(), 2)
+        self.assertEqual(Category.objects.filter(parent=self.child).get(), self.leaf)
+
+    def test_duplicate_into_own_subtree(self):
+        self.assertEqual(self.duplicate(parent=self.leaf).status_code, 302)
+        copy = Category.objects.get(name='copy')
+        self.assertEqual(copy.parent, self.leaf)
+        # 複製先を追加する前の部分木だけを複製する
+        self.assertEqual(copy.subtree().count(), 3)
@@ -0,0 +1,61 @@
+from unittest import mock
+from django.test import TestCase
+from django.urls import reverse
+from webapp import views
+from webapp.models import User, Category, Item
+
+AJAX = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+
+
+class FragmentResponseTests(TestCase):
+    """
+    非同期の並び替え・削除は変更したカードと最初・最後のpkだけを返す
+    """
+    def setUp(self):
+        self.user = User.objects.create_user('user@example.com', 'password')
+        self.client.force_login(self.user)
+        self.category = Category.objects.create(owner=self.user, name='category')
+        self.items = [
+            Item.objects.create(owner=self.user, category=self.category, title='item{}'.format(i), mark=1, order=i)
+            for i in range(3)
+        ]
+        self.url = reverse('webapp:item_list') + '?category={}'.format(self.category.pk)
+
+    def test_move_returns_swapped_cards(self):
+        first, second, third = self.items
+        response = self.client.post(self.url, {'up': second.pk}, **AJAX)
+        data = response.json()
+        self.assertEqual([card['pk'] for card in data['cards']], [second.pk, first.pk])
+        self.assertIn('item1', data['cards'][0]['html'])
+        # 入れ替えた結果の最初・最後
+        self.assertEqual((data['first_pk'], data['last_pk']), (second.pk, third.pk))
+        self.assertEqual(list(Item.objects.order_by('order').values_list('pk', flat=True)), [second.pk, first.pk, third.pk])
+
+    def test_move_at_edge(self):
+        data = self.client.post(self.url, {'up': self.items[0].pk}, **AJAX).json()
+        self.assertEqual(data['cards'], [])
+
+    def test_move_conflict(self):
+        with mock.patch.object(views.ItemList, '_update_order', side_effect=views.ConcurrentUpdate):
+            response = self.client.post(self.url, {'down': self.items[0].pk}, **AJAX)
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('error', response.json())
+
+    def test_move_without_ajax_redirects(self):
+        response = self.client.post(self.url, {'down': self.items[0].pk})
+        self.assertRedirects(response, self.url, fetch_redirect_response=False)
+
+    def test_delete_returns_edges(self):
+        other = Item.objects.create(owner=self.user, title='uncategorized', mark=1, order=-1)
+        url = reverse('webapp:item_delete', args=[self.items[0].pk]) + '?category={}'.format(self.category.pk)
+        data = self.client.post(url, **AJAX).json()
+        self.assertEqual(data['deleted'], self.items[0].pk)
+        # 同じカテゴリのアイテムだけが対象
+        self.assertEqual((data['first_pk'], data['last_pk']), (self.items[1].pk, self.items[2].pk))
+        self.assertNotEqual(data['first_pk'], other.pk)
+
+    def test_category_move(self):
+        other = Category.objects.create(owner=self.user, name='other', order=1)
+        data = self.client.post(reverse('webapp:category_list'), {'down': self.category.pk}, **AJAX).json()
+        self.assertEqual([card['pk'] for card in data['cards']], [other.pk, self.category.pk])
+        self.assertEqual((data['first_pk'], data['last_pk']), (other.pk, self.category.pk))
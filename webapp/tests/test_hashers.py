@@ -0,0 +1,38 @@
+from django.contrib.auth.hashers import check_password, identify_hasher, make_password
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from webapp.hashers import TunedPBKDF2PasswordHasher
+from webapp.models import User
+
+
+@override_settings(PASSWORD_HASHERS=['webapp.hashers.TunedPBKDF2PasswordHasher'])
+class PasswordHasherTests(TestCase):
+    """
+    パスワードのハッシュの設定と再ハッシュ
+    """
+    def iterations(self, encoded):
+        return int(encoded.split('$')[1])
+
+    @override_settings(PASSWORD_PBKDF2_ITERATIONS=1000)
+    def test_iterations_from_settings(self):
+        encoded = make_password('password')
+        self.assertIsInstance(identify_hasher(encoded), TunedPBKDF2PasswordHasher)
+        self.assertEqual(self.iterations(encoded), 1000)
+        self.assertTrue(check_password('password', encoded))
+
+    def test_rehash_on_login(self):
+        with self.settings(PASSWORD_PBKDF2_ITERATIONS=1000):
+            user = User.objects.create_user('user@example.com', 'password')
+        with self.settings(PASSWORD_PBKDF2_ITERATIONS=2000):
+            response = self.client.post(reverse('webapp:login'), {'username': 'user@example.com', 'password': 'password'})
+        self.assertEqual(response.status_code, 302)
+        user.refresh_from_db()
+        self.assertEqual(self.iterations(user.password), 2000)
+
+    def test_no_rehash_with_wrong_password(self):
+        with self.settings(PASSWORD_PBKDF2_ITERATIONS=1000):
+            user = User.objects.create_user('user@example.com', 'password')
+        with self.settings(PASSWORD_PBKDF2_ITERATIONS=2000):
+            self.client.post(reverse('webapp:login'), {'username': 'user@example.com', 'password': 'wrong'})
+        user.refresh_from_db()
+        self.assertEqual(self.iterations(user.password), 1000)
@@ -0,0 +1,50 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from webapp.models import User, Item
+
+
+class OwnerPredicateTests(TestCase):
+    """
+    アイテムの保存・削除はオーナーで絞り込む（パーティションの絞り込みのため）
+    """
+    def setUp(self):
+        self.user = User.objects.create_user('user@example.com', 'password')
+        self.client.force_login(self.user)
+        self.item = Item.objects.create(owner=self.user, title='item', mark=1)
+
+    def statements(self, queries, verb):
+        return [q['sql'] for q in queries.captured_queries if q['sql'].startswith(verb) and 'webapp_item' in q['sql']]
+
+    def test_update(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('webapp:item_update', args=[self.item.pk]), {
+                'title': 'changed',
+                'description': 'description',
+                'mark': 1,
+                'version': self.item.version,
+            })
+        self.assertEqual(response.status_code, 302)
+        updates = self.statements(queries, 'UPDATE')
+        self.assertTrue(updates)
+        for sql in updates:
+            self.assertIn('"owner_id" = {}'.format(self.user.pk), sql)
+        self.item.refresh_from_db()
+        self.assertEqual((self.item.title, self.item.excerpt), ('changed', 'description'))
+
+    def test_save_fields_does_not_touch_other_owners(self):
+        other = User.objects.create_user('other@example.com', 'password')
+        self.item.owner_id = other.pk
+        self.item.title = 'changed'
+        self.assertEqual(Item.all_objects.save_fields(self.item, ['title']), 0)
+        self.assertEqual(Item.objects.get(pk=self.item.pk).title, 'item')
+
+    def test_delete(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('webapp:item_delete', args=[self.item.pk]))
+        self.assertEqual(response.status_code, 302)
+        deletes = self.statements(queries, 'DELETE')
+        self.assertEqual(len(deletes), 1)
+        self.assertIn('"owner_id" = {}'.format(self.user.pk), deletes[0])
+        self.assertFalse(Item.all_objects.filter(pk=self.item.pk).exists())
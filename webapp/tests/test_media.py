@@ -0,0 +1,119 @@
+import io
+import shutil
+import tempfile
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from webapp.models import User, Category, Item, MediaQuotaExceeded
+from .utils import png
+
+
+class MediaAccountingTests(TestCase):
+    """
+    画像の使用容量
+    """
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create_user('user@example.com', 'password')
+        self.client.force_login(self.user)
+
+    def media_bytes(self):
+        return User.objects.get(pk=self.user.pk).media_bytes
+
+    def create_item(self, title, category=None):
+        data = {'title': title, 'mark': 1, 'image': png()}
+        if category:
+            data['category'] = category.pk
+        return self.client.post(reverse('webapp:item_create'), data)
+
+    def test_upload_and_delete(self):
+        self.create_item('item')
+        item = Item.objects.get(title='item')
+        self.assertGreater(item.image_size, 0)
+        self.assertEqual(self.media_bytes(), item.image_size)
+        self.client.post(reverse('webapp:item_delete', args=[item.pk]))
+        self.assertEqual(self.media_bytes(), 0)
+
+    def test_replace_image(self):
+        self.create_item('item')
+        item = Item.objects.get(title='item')
+        self.client.post(reverse('webapp:item_update', args=[item.pk]), {
+            'title': 'item',
+            'mark': 1,
+            'version': item.version,
+            'image': png('large.png', (200, 200)),
+        })
+        item.refresh_from_db()
+        self.assertEqual(self.media_bytes(), item.image_size)
+
+    def test_shared_image_released_once(self):
+        # 複製したカテゴリと一緒に親カテゴリを削除しても、共有している画像は1回だけ減らす
+        parent = Category.objects.create(owner=self.user, name='parent')
+        child = Category.objects.create(owner=self.user, name='child', parent=parent)
+        self.create_item('item', child)
+        size = self.media_bytes()
+        self.assertGreater(size, 0)
+        self.client.post(reverse('webapp:category_duplicate', args=[child.pk]), {'name': 'copy', 'parent': parent.pk})
+        self.assertEqual(Item.objects.filter(owner=self.user).count(), 2)
+        self.assertEqual(self.media_bytes(), size)
+
+        self.client.post(reverse('webapp:category_delete', args=[parent.pk]))
+        self.assertFalse(Item.objects.filter(owner=self.user).exists())
+        self.assertEqual(self.media_bytes(), 0)
+
+    def test_shared_image_kept_by_remaining_item(self):
+        # 残っているアイテムと共有している画像は、最後のアイテムを削除したときに減らす
+        category = Category.objects.create(owner=self.user, name='category')
+        self.create_item('item', category)
+        size = self.media_bytes()
+        self.client.post(reverse('webapp:category_duplicate', args=[category.pk]), {'name': 'copy'})
+        copy = Category.objects.get(name='copy')
+        self.client.post(reverse('webapp:category_delete', args=[copy.pk]))
+        self.assertEqual(self.media_bytes(), size)
+
+        item = Item.objects.get(title='item')
+        self.client.post(reverse('webapp:item_delete', args=[item.pk]))
+        self.assertEqual(self.media_bytes(), 0)
+
+    def test_admin_bulk_delete(self):
+        self.create_item('first')
+        self.create_item('second')
+        admin = User.objects.create_superuser('admin@example.com', 'password')
+        self.client.force_login(admin)
+        self.client.post(reverse('admin:webapp_item_changelist'), {
+            'action': 'delete_selected',
+            '_selected_action': list(Item.objects.values_list('pk', flat=True)),
+            'post': 'yes',
+        })
+        self.assertFalse(Item.objects.exists())
+        self.assertEqual(self.media_bytes(), 0)
+
+    def test_quota_in_form(self):
+        with override_settings(MEDIA_QUOTA_BYTES=10):
+            response = self.create_item('item')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('image', response.context['form'].errors)
+        self.assertFalse(Item.objects.exists())
+
+    def test_quota_on_save(self):
+        # フォームの確認を通っても、保存時に上限を超えれば失敗する
+        User.objects.filter(pk=self.user.pk).update(media_bytes=100)
+        with override_settings(MEDIA_QUOTA_BYTES=110):
+            with self.assertRaises(MediaQuotaExceeded):
+                with transaction.atomic():
+                    Item.objects.create(owner=self.user, title='item', image=png())
+        self.assertEqual(self.media_bytes(), 100)
+
+    def test_reconcile(self):
+        self.create_item('item')
+        size = Item.objects.get(title='item').image_size
+        User.objects.filter(pk=self.user.pk).update(media_bytes=12345)
+        Item.objects.update(image_size=1)
+        call_command('reconcile_media', stdout=io.StringIO())
+        self.assertEqual(self.media_bytes(), size)
+        self.assertEqual(Item.objects.get(title='item').image_size, size)
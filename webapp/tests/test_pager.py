@@ -0,0 +1,39 @@
+from django.core.paginator import Paginator
+from django.test import RequestFactory, SimpleTestCase
+from webapp.paginators import CountFreePaginator
+from webapp.templatetags.extra_tag import pager
+
+
+class PagerTests(SimpleTestCase):
+    """
+    ページネーションのタグ（表示するページ番号だけを計算する）
+    """
+    def render(self, paginator, number, query=''):
+        request = RequestFactory().get('/item_list/?' + query)
+        return pager({'request': request, 'page_obj': paginator.page(number)})
+
+    def numbers(self, context):
+        return [page for page, url in context['pages']]
+
+    def test_window_and_gaps(self):
+        context = self.render(Paginator(range(1000), 10), 50)
+        self.assertEqual(self.numbers(context), [1, None, 48, 49, 50, 51, 52, None, 100])
+        self.assertEqual(context['previous_url'], '?page=49')
+        self.assertEqual(context['next_url'], '?page=51')
+
+    def test_first_page(self):
+        context = self.render(Paginator(range(30), 10), 1)
+        self.assertEqual(self.numbers(context), [1, 2, 3])
+        self.assertIsNone(context['previous_url'])
+
+    def test_keeps_other_parameters(self):
+        context = self.render(Paginator(range(30), 10), 2, 'category=5&page=2')
+        self.assertEqual(context['pages'][0], (1, '?category=5&page=1'))
+
+    def test_count_free_paginator(self):
+        # 件数が分からない場合は次のページまで表示する
+        context = self.render(CountFreePaginator(list(range(100)), 10), 5)
+        self.assertEqual(self.numbers(context), [1, None, 3, 4, 5, 6])
+        context = self.render(CountFreePaginator(list(range(45)), 10), 5)
+        self.assertEqual(self.numbers(context), [1, None, 3, 4, 5])
+        self.assertIsNone(context['next_url'])
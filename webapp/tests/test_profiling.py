@@ -0,0 +1,65 @@
+import glob
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from webapp import views
+from webapp.models import User, Item
+
+
+class ProfilingTests(TestCase):
+    """
+    リクエストのプロファイル
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        settings = override_settings(PROFILING_ENABLED=True, PROFILING_DIR=self.directory, PROFILING_SAMPLE_INTERVAL=0.0005)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create_user('staff@example.com', 'password', is_staff=True)
+        self.client.force_login(self.user)
+        Item.objects.create(owner=self.user, title='item', mark=1)
+
+    def files(self, suffix):
+        return glob.glob(os.path.join(self.directory, '*' + suffix))
+
+    def load(self, suffix):
+        paths = [path for path in self.files(suffix) if suffix == '.speedscope.json' or not path.endswith('.speedscope.json')]
+        self.assertEqual(len(paths), 1)
+        with open(paths[0]) as f:
+            return json.load(f)
+
+    def test_only_requested_by_staff(self):
+        self.client.get(reverse('webapp:item_list'))
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_profile_files(self):
+        self.client.get(reverse('webapp:item_list'), HTTP_X_PROFILE='1')
+        self.assertEqual(len(self.files('.prof')), 1)
+        summary = self.load('.json')
+        self.assertEqual(summary['status'], 200)
+        self.assertGreater(summary['sql']['count'], 0)
+        self.assertGreater(summary['templates']['render_calls'], 0)
+
+        speedscope = self.load('.speedscope.json')
+        profile = speedscope['profiles'][0]
+        self.assertEqual(profile['type'], 'sampled')
+        self.assertEqual(len(profile['samples']), len(profile['weights']))
+        frames = len(speedscope['shared']['frames'])
+        self.assertTrue(all(0 <= index < frames for sample in profile['samples'] for index in sample))
+
+    @mock.patch.object(views.ItemList, 'streaming', True)
+    def test_streaming_response_is_profiled_until_sent(self):
+        response = self.client.get(reverse('webapp:item_list'), HTTP_X_PROFILE='1')
+        # 送信し終わるまでは保存しない
+        self.assertEqual(self.files('.prof'), [])
+        content = b''.join(response.streaming_content)
+        self.assertIn(b'item', content)
+        self.assertEqual(len(self.files('.prof')), 1)
+        summary = self.load('.json')
+        # カードの描画時のアイテムのクエリも含む
+        self.assertTrue(any('webapp_item' in query['sql'] for query in summary['sql']['queries']))
@@ -0,0 +1,72 @@
+from datetime import timedelta
+from unittest import mock
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from webapp import tasks
+from webapp.models import User, Category, Item
+
+
+@override_settings(ACTIVATION_TIMEOUT_SECONDS=60)
+class PurgeInactiveUsersTests(TestCase):
+    """
+    仮登録のまま有効期限が切れたユーザーの削除
+    """
+    def create_user(self, email, is_active=False, age=120):
+        user = User.objects.create_user(email, 'password', is_active=is_active)
+        User.objects.filter(pk=user.pk).update(date_joined=timezone.now() - timedelta(seconds=age))
+        return user
+
+    def test_purge_only_stale_users(self):
+        stale = self.create_user('stale@example.com')
+        fresh = self.create_user('fresh@example.com', age=0)
+        active = self.create_user('active@example.com', is_active=True)
+        self.assertEqual(tasks.purge_inactive_users_batch(), 1)
+        self.assertFalse(User.objects.filter(pk=stale.pk).exists())
+        self.assertEqual(set(User.objects.all()), {fresh, active})
+
+    def test_user_activated_after_the_read_is_kept(self):
+        user = self.create_user('user@example.com', is_active=True)
+        # 対象を読み込んだ時点ではまだ仮登録だったことにする
+        read = User.objects.filter(pk=user.pk)
+        with mock.patch.object(tasks, 'stale_inactive_users', side_effect=[read, tasks.stale_inactive_users()]):
+            self.assertEqual(tasks.purge_inactive_users_batch(), 1)
+        self.assertTrue(User.objects.filter(pk=user.pk).exists())
+
+
+@override_settings(PURGE_BATCH_SIZE=2)
+class PurgeUserTests(TestCase):
+    """
+    論理削除したユーザーのデータの物理削除
+    """
+    def setUp(self):
+        self.user = User.objects.create_user('user@example.com', 'password')
+        self.client.force_login(self.user)
+        parent = None
+        for i in range(3):
+            parent = Category.objects.create(owner=self.user, name='category{}'.format(i), parent=parent)
+            Item.objects.create(owner=self.user, category=parent, title='item{}'.format(i), mark=1)
+        self.other = User.objects.create_user('other@example.com', 'password')
+        Item.objects.create(owner=self.other, title='other', mark=1)
+
+    def test_soft_delete_then_purge(self):
+        self.client.post(reverse('webapp:user_delete', args=[self.user.pk]))
+        user = User.objects.get(pk=self.user.pk)
+        self.assertFalse(user.is_active)
+        self.assertIsNotNone(user.deleted_at)
+        # メールアドレスは再登録できる
+        self.assertEqual(user.email, '{}@deleted.invalid'.format(user.pk))
+
+        # 一定件数ずつ、子カテゴリから先に削除する
+        runs = 0
+        while User.objects.filter(pk=self.user.pk).exists():
+            tasks.purge_user(self.user.pk)
+            runs += 1
+        self.assertEqual(runs, 5)
+        self.assertFalse(Item.all_objects.filter(owner_id=self.user.pk).exists())
+        self.assertFalse(Category.objects.filter(owner_id=self.user.pk).exists())
+        self.assertEqual(Item.objects.filter(owner=self.other).count(), 1)
+
+    def test_active_user_is_not_purged(self):
+        tasks.purge_user(self.user.pk)
+        self.assertEqual(Item.objects.filter(owner=self.user).count(), 3)
@@ -0,0 +1,50 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from webapp.models import User
+
+
+@override_settings(RATELIMITS={'login': (10, 60), 'login_email': (2, 60), 'password_reset': (2, 60), 'password_reset_email': (1, 60)})
+class RateLimitTests(TestCase):
+    """
+    IPアドレス・メールアドレスごとのリクエスト数の制限
+    """
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user('user@example.com', 'password')
+
+    def login(self, password, email='user@example.com', ip='127.0.0.1'):
+        return self.client.post(reverse('webapp:login'), {'username': email, 'password': password}, REMOTE_ADDR=ip)
+
+    def test_successful_logins_do_not_consume_email_tokens(self):
+        for _ in range(3):
+            self.assertEqual(self.login('password').status_code, 302)
+            self.client.logout()
+
+    def test_failed_logins_lock_the_email(self):
+        for _ in range(2):
+            self.assertEqual(self.login('wrong').status_code, 200)
+        # 別のIPアドレスからでも、正しいパスワードでもログインできない
+        response = self.login('password', ip='10.0.0.1')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        # 大文字・小文字の違いは同じメールアドレスとして扱う
+        self.assertEqual(self.login('password', email=' USER@example.com', ip='10.0.0.1').status_code, 429)
+        # 他のメールアドレスは制限しない
+        self.assertEqual(self.login('wrong', email='other@example.com', ip='10.0.0.1').status_code, 200)
+
+    def test_ip_limit(self):
+        for i in range(10):
+            self.assertNotEqual(self.login('wrong', email='user{}@example.com'.format(i)).status_code, 429)
+        self.assertEqual(self.login('password').status_code, 429)
+        self.assertEqual(self.login('password', ip='10.0.0.1').status_code, 302)
+
+    def test_email_limit_before_sending_mail(self):
+        url = reverse('webapp:password_reset')
+        self.assertNotEqual(self.client.post(url, {'email': 'user@example.com'}).status_code, 429)
+        self.assertEqual(self.client.post(url, {'email': 'user@example.com'}, REMOTE_ADDR='10.0.0.1').status_code, 429)
+
+    def test_get_is_not_limited(self):
+        for _ in range(20):
+            self.assertEqual(self.client.get(reverse('webapp:login')).status_code, 200)
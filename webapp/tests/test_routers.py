@@ -0,0 +1,23 @@
+from django.test import SimpleTestCase, override_settings
+from webapp.models import Item
+from webapp.routers import ReplicaRouter, replica_reads
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    """
+    リードレプリカへの振り分け
+    """
+    @override_settings(REPLICA_DATABASES=['replica'])
+    def test_reads_in_block(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Item), 'default')
+        with replica_reads():
+            self.assertEqual(router.db_for_read(Item), 'replica')
+            self.assertEqual(router.db_for_write(Item), 'default')
+        self.assertEqual(router.db_for_read(Item), 'default')
+        self.assertFalse(router.allow_migrate('replica', 'webapp'))
+
+    @override_settings(REPLICA_DATABASES=[])
+    def test_without_replicas(self):
+        with replica_reads():
+            self.assertEqual(ReplicaRouter().db_for_read(Item), 'default')
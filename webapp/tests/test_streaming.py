@@ -0,0 +1,52 @@
+from unittest import mock
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from webapp import views
+from webapp.models import User, Item
+
+
+@mock.patch.object(views.ItemList, 'streaming', True)
+@mock.patch.object(views.ItemList, 'paginate_by', 2)
+class ItemListStreamingTests(TestCase):
+    """
+    アイテム一覧のストリーミング
+    """
+    def setUp(self):
+        self.user = User.objects.create_user('user@example.com', 'password')
+        self.client.force_login(self.user)
+        self.items = [
+            Item.objects.create(owner=self.user, title='item{}'.format(i), mark=1, order=i)
+            for i in range(3)
+        ]
+
+    def test_head_is_sent_before_the_list_queries(self):
+        response = self.client.get(reverse('webapp:item_list'))
+        chunks = iter(response.streaming_content)
+        with CaptureQueriesContext(connection) as queries:
+            head = next(chunks).decode()
+        self.assertIn('<form method="post" data-fragment-list>', head)
+        self.assertNotIn('item0', head)
+        self.assertFalse([q for q in queries.captured_queries if 'webapp_item' in q['sql']])
+
+        rest = b''.join(chunks).decode()
+        self.assertIn('item0', rest)
+        self.assertIn('item1', rest)
+        self.assertNotIn('item2', rest)
+        self.assertIn('page=2', rest)
+        # 最初のアイテムは上に、最後のアイテムは下に移動できない
+        self.assertIn('name="up" value="{}" class="icon-btn" disabled'.format(self.items[0].pk), rest)
+        self.assertNotIn('name="down" value="{}" class="icon-btn" disabled'.format(self.items[1].pk), rest)
+
+    def test_second_page(self):
+        response = self.client.get(reverse('webapp:item_list'), {'page': 2})
+        content = b''.join(response.streaming_content).decode()
+        self.assertIn('item2', content)
+        self.assertIn('name="down" value="{}" class="icon-btn" disabled'.format(self.items[2].pk), content)
+
+    def test_invalid_page_falls_back_to_first(self):
+        response = self.client.get(reverse('webapp:item_list'), {'page': 9})
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content).decode()
+        self.assertIn('item0', content)
@@ -0,0 +1,131 @@
+import signal
+from datetime import timedelta
+from unittest import mock
+from django.db import OperationalError, transaction
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+from webapp import tasks
+from webapp.management.commands import runworker
+from webapp.models import Task
+from .utils import png
+
+# テスト用タスクの呼び出し記録
+calls = []
+
+
+@tasks.task
+def record_call(*args, **kwargs):
+    calls.append((args, kwargs))
+
+
+@tasks.task
+def always_fail():
+    raise RuntimeError('failed')
+
+
+class TaskQueueTests(TransactionTestCase):
+    """
+    バックグラウンドタスク
+    """
+    def setUp(self):
+        calls.clear()
+
+    @override_settings(TASK_ALWAYS_EAGER=True)
+    def test_eager_runs_after_commit(self):
+        with transaction.atomic():
+            tasks.enqueue(record_call, 1, key='value')
+            self.assertEqual(calls, [])
+        self.assertEqual(calls, [((1,), {'key': 'value'})])
+        self.assertFalse(Task.objects.exists())
+
+    @override_settings(TASK_ALWAYS_EAGER=True)
+    def test_eager_skips_future_tasks(self):
+        tasks.enqueue(record_call, run_at=timezone.now() + timedelta(hours=1))
+        self.assertEqual(calls, [])
+
+    def test_enqueue_rejects_unregistered(self):
+        with self.assertRaises(ValueError):
+            tasks.enqueue(png)
+
+    def test_claim_and_run(self):
+        tasks.enqueue(record_call, 1, priority=1)
+        task = tasks.claim()
+        self.assertEqual(task.name, 'record_call')
+        self.assertEqual(task.attempts, 1)
+        self.assertEqual(Task.objects.get(pk=task.pk).status, Task.STATUS_RUNNING)
+        # ロック中（実行中）のタスクは期限まで再取得されない
+        self.assertIsNone(tasks.claim())
+
+        self.assertTrue(tasks.run(task))
+        self.assertEqual(calls, [((1,), {})])
+        self.assertFalse(Task.objects.exists())
+
+    def test_claim_order(self):
+        tasks.enqueue(record_call, 'low', priority=-1)
+        tasks.enqueue(record_call, 'high', priority=1)
+        self.assertEqual(tasks.claim().args, '["high"]')
+
+    @override_settings(TASK_RETRY_DELAY_SECONDS=60)
+    def test_retry_then_fail(self):
+        tasks.enqueue(always_fail, max_attempts=2)
+        task = tasks.claim()
+        with self.assertLogs('webapp.tasks', 'ERROR'):
+            self.assertFalse(tasks.run(task))
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.STATUS_QUEUED)
+        self.assertGreater(task.run_at, timezone.now())
+        self.assertIn('RuntimeError', task.last_error)
+        self.assertIsNone(tasks.claim())
+
+        # 再試行の時刻になったら再取得され、最大試行回数で失敗状態になる
+        Task.objects.filter(pk=task.pk).update(run_at=timezone.now())
+        task = tasks.claim()
+        self.assertEqual(task.attempts, 2)
+        with self.assertLogs('webapp.tasks', 'ERROR'):
+            self.assertFalse(tasks.run(task))
+        self.assertEqual(Task.objects.get(pk=task.pk).status, Task.STATUS_FAILED)
+
+    @override_settings(TASK_LEASE_SECONDS=60)
+    def test_expired_lease_is_reclaimed(self):
+        tasks.enqueue(record_call)
+        task = tasks.claim()
+        Task.objects.filter(pk=task.pk).update(run_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(tasks.claim().pk, task.pk)
+
+
+class WorkerTests(TransactionTestCase):
+    """
+    ワーカーのループ
+    """
+    def setUp(self):
+        calls.clear()
+        # work()が差し替えるシグナルハンドラを元に戻す
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            self.addCleanup(signal.signal, signum, signal.getsignal(signum))
+
+    def test_runs_until_empty(self):
+        tasks.enqueue(record_call, 1)
+        tasks.enqueue(record_call, 2)
+        runworker.work(sleep=0, once=True)
+        self.assertEqual(len(calls), 2)
+        self.assertFalse(Task.objects.exists())
+
+    def test_survives_errors_with_backoff(self):
+        tasks.enqueue(record_call)
+        claim = tasks.claim
+        errors = [OperationalError('gone'), OperationalError('gone')]
+
+        def flaky_claim():
+            # 最初の2回はDB障害で失敗させる
+            if errors:
+                raise errors.pop()
+            return claim()
+
+        with mock.patch.object(tasks, 'claim', flaky_claim), \
+                mock.patch.object(runworker, 'close_old_connections') as close_old, \
+                mock.patch.object(runworker.time, 'sleep') as sleep, \
+                self.assertLogs(runworker.logger, 'ERROR'):
+            runworker.work(sleep=1, once=True)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(close_old.call_count, 4)
+        self.assertEqual([c[0][0] for c in sleep.call_args_list], [2, 4])
@@ -0,0 +1,57 @@
+from unittest import mock
+from django.core import signing
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from webapp import caches
+from webapp.models import User
+
+
+class UsedTokenTests(TestCase):
+    """
+    登録・メールアドレス変更用URLの使用済みトークン
+    """
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_use_token_once(self):
+        self.assertFalse(caches.is_token_used('a', 'b'))
+        self.assertTrue(caches.use_token('a', 'b'))
+        self.assertFalse(caches.use_token('a', 'b'))
+        self.assertTrue(caches.is_token_used('a', 'b'))
+        self.assertFalse(caches.is_token_used('a'))
+
+    def test_activation_replay_skips_database(self):
+        user = User.objects.create_user('user@example.com', 'password', is_active=False)
+        url = reverse('webapp:user_create_complete', args=[signing.dumps(user.pk)])
+        self.client.get(url)
+        self.assertTrue(User.objects.get(pk=user.pk).is_active)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_bad_activation_token(self):
+        self.assertEqual(self.client.get(reverse('webapp:user_create_complete', args=['bad'])).status_code, 404)
+
+    def test_email_change_replay(self):
+        user = User.objects.create_user('user@example.com', 'password')
+        self.client.force_login(user)
+        url = reverse('webapp:email_change_complete', args=[signing.dumps(user.pk), signing.dumps('new@example.com')])
+        self.client.get(url)
+        self.assertEqual(User.objects.get(pk=user.pk).email, 'new@example.com')
+
+        with mock.patch.object(User, 'save') as save:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        save.assert_not_called()
+
+    def test_email_change_replay_by_other_user(self):
+        # 本人以外には使用済みかどうかも返さない
+        user = User.objects.create_user('user@example.com', 'password')
+        url = reverse('webapp:email_change_complete', args=[signing.dumps(user.pk), signing.dumps('new@example.com')])
+        self.client.force_login(user)
+        self.client.get(url)
+        other = User.objects.create_user('other@example.com', 'password')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(url).status_code, 404)
@@ -0,0 +1,65 @@
+from django.test import TestCase
+from django.urls import reverse
+from webapp import views
+from webapp.models import User, Category, Item
+
+
+class VersionConflictTests(TestCase):
+    """
+    同時更新の検出（バージョン・並び順）
+    """
+    def setUp(self):
+        self.user = User.objects.create_user('user@example.com', 'password')
+        self.client.force_login(self.user)
+
+    def create_item(self, title):
+        self.client.post(reverse('webapp:item_create'), {'title': title, 'mark': 1})
+        return Item.objects.get(title=title)
+
+    def update_item(self, item, version, title):
+        return self.client.post(reverse('webapp:item_update', args=[item.pk]), {
+            'title': title,
+            'mark': 1,
+            'version': version,
+        })
+
+    def test_stale_version_is_rejected(self):
+        item = self.create_item('item')
+        version = item.version
+        self.assertEqual(self.update_item(item, version, 'first').status_code, 302)
+        response = self.update_item(item, version, 'second')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].non_field_errors())
+        item.refresh_from_db()
+        self.assertEqual(item.title, 'first')
+        self.assertEqual(item.version, version + 1)
+
+    def test_create_and_reorder_do_not_conflict(self):
+        item = self.create_item('item')
+        version = item.version
+        other = self.create_item('other')
+        self.client.post(reverse('webapp:item_list'), {'down': other.pk})
+        item.refresh_from_db()
+        order = item.order
+
+        self.assertEqual(self.update_item(item, version, 'changed').status_code, 302)
+        item.refresh_from_db()
+        self.assertEqual(item.title, 'changed')
+        self.assertEqual(item.order, order)
+
+    def test_reorder_detects_renumbering(self):
+        item = self.create_item('item')
+        # 読み込み後に順序が変わっていれば入れ替えない
+        self.create_item('other')
+        with self.assertRaises(views.ConcurrentUpdate):
+            views.OrderMoveMixin()._update_order(item, 5)
+
+    def test_stale_category_version_is_rejected(self):
+        self.client.post(reverse('webapp:category_create'), {'name': 'category'})
+        category = Category.objects.get(name='category')
+        url = reverse('webapp:category_update', args=[category.pk])
+        self.client.post(url, {'name': 'first', 'version': category.version})
+        response = self.client.post(url, {'name': 'second', 'version': category.version})
+        self.assertEqual(response.status_code, 200)
+        category.refresh_from_db()
+        self.assertEqual(category.name, 'first')
@@ -0,0 +1,50 @@
+from unittest import mock
+from django.apps import apps
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from webapp import warmup
+
+
+@override_settings(STARTUP_WARMUP=True)
+class ReadyzTests(TestCase):
+    """
+    起動時のウォームアップと準備完了の確認
+    """
+    def setUp(self):
+        self.addCleanup(setattr, warmup, 'done', warmup.done)
+        self.addCleanup(setattr, warmup, 'failed', warmup.failed)
+        warmup.done = False
+        warmup.failed = []
+
+    def test_app_loading_does_not_warm_up(self):
+        # 管理コマンド・テストではウォームアップしない
+        with mock.patch.object(warmup, 'warm_connections') as warm_connections:
+            apps.get_app_config('webapp').ready()
+        warm_connections.assert_not_called()
+        self.assertFalse(warmup.done)
+
+    def test_not_ready_until_warmed_up(self):
+        response = self.client.get(reverse('webapp:readyz'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.content, b'warming up')
+
+        warmup.warm_up()
+        self.assertTrue(warmup.done)
+        self.assertEqual(warmup.failed, [])
+        response = self.client.get(reverse('webapp:readyz'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_failed_database_is_rechecked(self):
+        with mock.patch.object(warmup, 'warm_connections', return_value=['replica']):
+            warmup.warm_up()
+            response = self.client.get(reverse('webapp:readyz'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.content, b'database unavailable: replica')
+
+        # 接続できるようになったら200を返す
+        response = self.client.get(reverse('webapp:readyz'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(warmup.failed, [])
+
+    def test_healthz(self):
+        self.assertEqual(self.client.get(reverse('webapp:healthz')).status_code, 200)
@@ -0,0 +1,12 @@
+import io
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+
+
+def png(name='image.png', size=(40, 40)):
+    """
+    テスト用のPNG画像
+    """
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (255, 0, 0)).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
@@ -19,11 +19,17 @@ urlpatterns = [
     path('reset/<uidb64>/<token>/', views.PasswordResetConfirm.as_view(), name='password_reset_confirm'),
     path('done/', views.Done.as_view(), name='done'),
     path('category_list/', views.CategoryList.as_view(), name='category_list'),
+    path('category_search/', views.CategorySearch.as_view(), name='category_search'),
     path('category_create/', views.CategoryCreate.as_view(), name='category_create'),
     path('category_update/<int:pk>/', views.CategoryUpdate.as_view(), name='category_update'),
+    path('category_duplicate/<int:pk>/', views.CategoryDuplicate.as_view(), name='category_duplicate'),
     path('category_delete/<int:pk>/', views.CategoryDelete.as_view(), name='category_delete'),
     path('item_list/', views.ItemList.as_view(), name='item_list'),
+    path('item_archive/', views.ItemArchive.as_view(), name='item_archive'),
     path('item_create/', views.ItemCreate.as_view(), name='item_create'),
+    path('item_body/<int:pk>/', views.ItemBody.as_view(), name='item_body'),
     path('item_update/<int:pk>/', views.ItemUpdate.as_view(), name='item_update'),
     path('item_delete/<int:pk>/', views.ItemDelete.as_view(), name='item_delete'),
+    path('healthz', views.Healthz.as_view(), name='healthz'),
+    path('readyz', views.Readyz.as_view(), name='readyz'),
 ]
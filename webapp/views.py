@@ -1,22 +1,135 @@
+from contextlib import nullcontext
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import views as auth_views
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.sites.shortcuts import get_current_site
 from django.core import signing
-from django.core.mail import send_mail
-from django.db import transaction
-from django.db.models import Q, Count
-from django.http import HttpResponseNotFound
-from django.shortcuts import redirect
-from django.template.loader import get_template
+from django.core.paginator import InvalidPage, Paginator
+from django.db import DatabaseError, connection, connections, transaction
+from django.db.models import F, Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.http import Http404, HttpResponse, HttpResponseNotFound, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, redirect
+from django.template.loader import get_template, render_to_string
 from django.urls import reverse_lazy
+from django.utils import timezone
+from django.utils.functional import cached_property
 from django.views import generic
-from . import forms
-from .models import User, Category, Item
+from . import caches, forms, tasks, warmup
+from .models import User, Category, Item, MediaQuotaExceeded, move_category, releasing_media, tree_order
+from .paginators import CountFreePaginator
+from .ratelimit import RateLimitMixin
+from .routers import replica_reads
 
+# ストリーミング時にカード・ページの後半を差し込む位置
+CARDS_MARKER = '<!-- cards -->'
+TAIL_MARKER = '<!-- tail -->'
 
-class Top(LoginRequiredMixin, generic.TemplateView):
+
+class ReplicaReadMixin:
+    """
+    GETリクエストの読み込みをリードレプリカで行う
+    """
+    def dispatch(self, request, *args, **kwargs):
+        if not self.use_replica():
+            return super().dispatch(request, *args, **kwargs)
+        with replica_reads():
+            response = super().dispatch(request, *args, **kwargs)
+            # テンプレートの描画時に評価されるクエリもレプリカで行う
+            if hasattr(response, 'render'):
+                response.render()
+        return response
+
+    def use_replica(self):
+        return self.request.method == 'GET' and not getattr(self.request, 'db_pinned', False)
+
+
+def count_subquery(queryset):
+    """
+    件数を返すサブクエリ（annotateで使う）
+    """
+    counts = queryset.order_by().values('owner').annotate(count=Count('pk')).values('count')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def edge_pks(queryset):
+    """
+    並び順で最初と最後のpkを返す
+    """
+    pks = queryset.values_list('pk', flat=True)
+    return {'first_pk': pks.first(), 'last_pk': pks.last()}
+
+
+class ConcurrentUpdate(Exception):
+    """
+    同時更新の競合
+    """
+    pass
+
+
+class OrderMoveMixin:
+    """
+    一覧の並び替え（読み込んだ順序による楽観的排他制御）
+    （バージョンは内容の変更の確認に使い、並び替えでは変えない）
+    """
+    move_retries = 3
+    conflict_message = '他の操作と競合したため並び替えできませんでした。もう一度お試しください。'
+
+    def move(self, pk, direction):
+        """
+        入れ替えたオブジェクトを新しい並び順で返す（競合した場合はNone）
+        """
+        for _ in range(self.move_retries):
+            # 入れ替え対象を取得
+            queryset = self.get_queryset()
+            current = queryset.get(pk=pk)
+            if direction == 'up':
+                other = queryset.filter(order__lt=current.order).last()
+            else:
+                other = queryset.filter(order__gt=current.order).first()
+            if other is None:
+                return []
+
+            # 読み込み後に更新されていなければ順序を入れ替える
+            try:
+                with transaction.atomic():
+                    self._update_order(current, other.order)
+                    self._update_order(other, current.order)
+            except ConcurrentUpdate:
+                continue
+            return [current, other] if direction == 'up' else [other, current]
+        return None
+
+    def move_response(self, moved):
+        """
+        入れ替えたカードのHTMLと最初・最後のpkを返す（非同期の並び替え用）
+        """
+        if moved is None:
+            return JsonResponse({'error': self.conflict_message}, status=409)
+        cards = [
+            {'pk': obj.pk, 'html': render_to_string(self.card_template_name, self.get_card_context(obj), self.request)}
+            for obj in moved
+        ]
+        return JsonResponse(dict(self.edges, cards=cards))
+
+    @cached_property
+    def edges(self):
+        return edge_pks(self.get_queryset())
+
+    def get_card_context(self, obj):
+        return dict(self.edges, **{self.model._meta.model_name: obj})
+
+    def _update_order(self, obj, order):
+        updated = type(obj).objects.filter(pk=obj.pk, owner_id=obj.owner_id, order=obj.order).update(
+            order=order,
+            updated_at=timezone.now(),
+        )
+        if not updated:
+            raise ConcurrentUpdate()
+
+
+class Top(LoginRequiredMixin, ReplicaReadMixin, generic.TemplateView):
     """
     トップページ
     """
@@ -24,28 +137,37 @@ class Top(LoginRequiredMixin, generic.TemplateView):
 
     def render_to_response(self, context):
         # カテゴリ一覧 or アイテム一覧ページにリダイレクト
-        category_count = Category.objects.filter(owner=self.request.user).count()
-        if category_count > 0:
-            return redirect('webapp:category_list')
-        else:
-            return redirect('webapp:item_list')
-        return super().render_to_response(context)
+        return redirect(caches.landing_url(self.request.user))
 
 
-class Login(auth_views.LoginView):
+class Login(RateLimitMixin, auth_views.LoginView):
     """
     ログインページ
     """
     form_class = forms.AuthenticationForm
     template_name = 'login.html'
+    ratelimit_scope = 'login'
+    ratelimit_methods = ('POST',)
+    ratelimit_email_scope = 'login_email'
+    ratelimit_email_field = 'username'
+    # 正しいパスワードでのログインはメールアドレスごとの制限を消費しない
+    ratelimit_email_on_invalid = True
+
+    def get_success_url(self):
+        # 遷移先の指定がなければトップページを経由せずに直接表示先に遷移
+        return self.get_redirect_url() or caches.landing_url(self.request.user)
 
 
-class UserCreate(generic.CreateView):
+class UserCreate(RateLimitMixin, generic.CreateView):
     """
     ユーザー登録ページ
     """
     form_class = forms.UserCreationForm
     template_name = 'user_create.html'
+    ratelimit_scope = 'user_create'
+    ratelimit_methods = ('POST',)
+    ratelimit_email_scope = 'user_create_email'
+    ratelimit_email_field = 'email'
 
     def form_valid(self, form):
         # 仮登録
@@ -65,23 +187,29 @@ class UserCreate(generic.CreateView):
         subject = subject_template.render(context)
         message_template = get_template('email/user_create_message.txt')
         message = message_template.render(context)
-        user.email_user(subject, message)
+        tasks.enqueue(tasks.send_mail, subject, message, [user.email])
 
         # 完了ページにリダイレクト
         messages.success(self.request, 'ユーザー登録用メールを送信しました。現時点ではユーザー登録は完了していません。\nメールが届きましたら、本文中に記載されているURLからユーザー登録を行ってください。')
         return redirect('webapp:done')
 
 
-class UserCreateComplete(generic.TemplateView):
+class UserCreateComplete(RateLimitMixin, generic.TemplateView):
     """
     ユーザー登録完了ページ
     """
     template_name = 'done.html'
     timeout_seconds = getattr(settings, 'ACTIVATION_TIMEOUT_SECONDS', 60*60*24)
+    ratelimit_scope = 'activation'
 
     def get(self, request, **kwargs):
-        # tokenを確認して問題なければ本登録
+        # 使用済みのtokenはデータベースにアクセスせずに完了とする
         token = kwargs.get('token')
+        if caches.is_token_used(token):
+            messages.success(self.request, 'ユーザー登録は完了しています。\n登録されたメールアドレスとパスワードでログインしてください。')
+            return super().get(request, **kwargs)
+
+        # tokenを確認して問題なければ本登録
         try:
             user_pk = signing.loads(token, max_age=self.timeout_seconds)
 
@@ -105,17 +233,24 @@ class UserCreateComplete(generic.TemplateView):
                     # 本登録
                     user.is_active = True
                     user.save()
+                caches.use_token(token)
                 messages.success(self.request, 'ユーザー登録が完了しました。\n登録されたメールアドレスとパスワードでログインしてください。')
                 return super().get(request, **kwargs)
 
 
-class UserDetail(LoginRequiredMixin, UserPassesTestMixin, generic.DetailView):
+class UserDetail(LoginRequiredMixin, UserPassesTestMixin, ReplicaReadMixin, generic.DetailView):
     """
     ユーザー情報ページ
     """
     model = User
     template_name = 'user_detail.html'
 
+    def get_context_data(self, **kwargs):
+        # 画像の使用容量の上限を設定
+        context = super().get_context_data(**kwargs)
+        context['media_quota'] = getattr(settings, 'MEDIA_QUOTA_BYTES', None)
+        return context
+
     def test_func(self):
         # 本人 or スーパーユーザーのみアクセスを許可する
         user = self.request.user
@@ -130,8 +265,25 @@ class UserDelete(LoginRequiredMixin, UserPassesTestMixin, generic.DeleteView):
     template_name = 'user_delete.html'
     success_url = reverse_lazy('webapp:done')
 
+    soft_delete = getattr(settings, 'USER_SOFT_DELETE', True)
+
     def delete(self, request, *args, **kwargs):
-        result = super().delete(request, *args, **kwargs)
+        if self.soft_delete:
+            # 論理削除してデータの削除はバックグラウンドで行う
+            # メールアドレスは再登録できるように開放する
+            self.object = self.get_object()
+            with transaction.atomic():
+                User.objects.filter(pk=self.object.pk).update(
+                    is_active=False,
+                    deleted_at=timezone.now(),
+                    email='{}@deleted.invalid'.format(self.object.pk),
+                )
+                tasks.enqueue(tasks.purge_user, self.object.pk, priority=-1)
+            result = redirect(self.get_success_url())
+        else:
+            # アイテムの画像ファイルの削除を予約する
+            with releasing_media(Item.all_objects.filter(owner_id=self.kwargs['pk'])):
+                result = super().delete(request, *args, **kwargs)
         messages.success(self.request, 'ユーザーを削除しました。')
         return result
 
@@ -170,19 +322,20 @@ class EmailChange(LoginRequiredMixin, generic.FormView):
         subject = subject_template.render(context)
         message_template = get_template('email/email_change_message.txt')
         message = message_template.render(context)
-        send_mail(subject, message, None, [new_email])
+        tasks.enqueue(tasks.send_mail, subject, message, [new_email])
 
         # 完了ページにリダイレクト
         messages.success(self.request, 'メールアドレス変更用メールを送信しました。\nメールが届きましたら、本文中に記載されているURLからメールアドレスの変更を行ってください。')
         return redirect('webapp:done')
 
 
-class EmailChangeComplete(LoginRequiredMixin, generic.TemplateView):
+class EmailChangeComplete(RateLimitMixin, LoginRequiredMixin, generic.TemplateView):
     """
     メールアドレス変更完了ページ
     """
     template_name = 'done.html'
     timeout_seconds = getattr(settings, 'ACTIVATION_TIMEOUT_SECONDS', 60*60*24)
+    ratelimit_scope = 'activation'
 
     def get(self, request, **kwargs):
         # tokenを確認して問題なければメールアドレス変更
@@ -203,16 +356,23 @@ class EmailChangeComplete(LoginRequiredMixin, generic.TemplateView):
 
         # 問題なし
         else:
-            if request.user.pk == user_pk:
-                # メールアドレス変更
-                User.objects.filter(email=new_email, is_active=False).delete()
-                request.user.email = new_email
-                request.user.save()
-                messages.success(self.request, 'メールアドレスの変更が完了しました。')
-                return super().get(request, **kwargs)
-            else:
+            # 本人以外は使用済みかどうかも返さない
+            if request.user.pk != user_pk:
                 return HttpResponseNotFound()
 
+            # 使用済みのtokenはデータベースにアクセスせずに完了とする
+            if caches.is_token_used(token1, token2):
+                messages.success(self.request, 'メールアドレスの変更は完了しています。')
+                return super().get(request, **kwargs)
+
+            # メールアドレス変更
+            User.objects.filter(email=new_email, is_active=False).delete()
+            request.user.email = new_email
+            request.user.save()
+            caches.use_token(token1, token2)
+            messages.success(self.request, 'メールアドレスの変更が完了しました。')
+            return super().get(request, **kwargs)
+
 
 class PasswordChange(auth_views.PasswordChangeView):
     """
@@ -227,7 +387,7 @@ class PasswordChange(auth_views.PasswordChangeView):
         return super().form_valid(form)
 
 
-class PasswordReset(auth_views.PasswordResetView):
+class PasswordReset(RateLimitMixin, auth_views.PasswordResetView):
     """
     パスワード再設定用メール送信ページ
     """
@@ -236,6 +396,10 @@ class PasswordReset(auth_views.PasswordResetView):
     subject_template_name = 'email/password_reset_subject.txt'
     email_template_name = 'email/password_reset_message.txt'
     success_url = reverse_lazy('webapp:done')
+    ratelimit_scope = 'password_reset'
+    ratelimit_methods = ('POST',)
+    ratelimit_email_scope = 'password_reset_email'
+    ratelimit_email_field = 'email'
 
     def form_valid(self, form):
         messages.success(self.request, 'パスワード再設定用メールを送信しました。\nメールが届きましたら、本文中に記載されているURLからパスワードの再設定を行ってください。')
@@ -262,21 +426,48 @@ class Done(generic.TemplateView):
     template_name = 'done.html'
 
 
-class CategoryList(LoginRequiredMixin, generic.ListView):
+class CategoryList(LoginRequiredMixin, ReplicaReadMixin, OrderMoveMixin, generic.ListView):
     """
     カテゴリ一覧ページ
     """
     model = Category
     context_object_name = 'category_list'
     template_name = 'category_list.html'
+    card_template_name = '_category_card.html'
     paginate_by = 10
+    paginator_class = CountFreePaginator if getattr(settings, 'PAGINATION_COUNT_FREE', False) else Paginator
+
+    @cached_property
+    def parent_pk(self):
+        # 親カテゴリの主キー（指定がなければNone、数値でなければ404）
+        value = self.request.GET.get('parent')
+        if value is None:
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            raise Http404
 
     def get_queryset(self):
-        # オーナーで絞り込み＆アイテム数を設定
-        return super().get_queryset().filter(
-            owner=self.request.user
-        ).annotate(
-            item_count=Count('item', filter=Q(item__owner=self.request.user))
+        # オーナー＆親カテゴリで絞り込み
+        queryset = super().get_queryset().filter(
+            owner=self.request.user,
+            parent=self.parent_pk,
+        )
+
+        # 子カテゴリ数と、子孫のカテゴリを含むアイテム数を設定（経路の前方一致のサブクエリ）
+        children = Category.objects.filter(
+            owner=self.request.user,
+            parent=OuterRef('pk'),
+        )
+        items = Item.objects.filter(
+            owner=self.request.user,
+            category__owner=self.request.user,
+            category__path__startswith=OuterRef('path'),
+        )
+        return queryset.annotate(
+            child_count=count_subquery(children),
+            item_count=count_subquery(items),
         ).order_by('order', '-created_at')
 
     def get_context_data(self, **kwargs):
@@ -286,38 +477,55 @@ class CategoryList(LoginRequiredMixin, generic.ListView):
             context['first_pk'] = self.object_list.first().pk
             context['last_pk'] = self.object_list.last().pk
 
-        # カテゴリなしのアイテム数を設定
-        null_item_count = Item.objects.filter(owner=self.request.user).filter(category__isnull=True).count()
-        context['null_item_count'] = null_item_count
+        if self.parent_pk is None:
+            # カテゴリなしのアイテム数を設定
+            null_item_count = Item.objects.filter(owner=self.request.user).filter(category__isnull=True).count()
+            context['null_item_count'] = null_item_count
+        else:
+            # 親カテゴリと祖先のカテゴリを設定
+            parent = get_object_or_404(Category, pk=self.parent_pk, owner=self.request.user)
+            ancestors = Category.objects.filter(pk__in=parent.ancestor_pks(), owner=self.request.user)
+            context['parent'] = parent
+            context['ancestors'] = sorted(ancestors, key=lambda category: category.depth)
         return context
 
-    @transaction.atomic
     def post(self, request, **kwargs):
-        self.object_list = self.get_queryset()
+        moved = []
         if 'up' in request.POST:
             # 上に移動
-            current_pk = request.POST.get('up')
-            current = self.object_list.get(pk=current_pk)
-            prev = self.object_list.filter(order__lt=current.order).last()
-            prev_order = prev.order
-            prev.order = current.order
-            current.order = prev_order
-            current.save()
-            prev.save()
+            moved = self.move(request.POST.get('up'), 'up')
 
         elif 'down' in request.POST:
             # 下に移動
-            current_pk = request.POST.get('down')
-            current = self.object_list.get(pk=current_pk)
-            next = self.object_list.filter(order__gt=current.order).first()
-            next_order = next.order
-            next.order = current.order
-            current.order = next_order
-            current.save()
-            next.save()
+            moved = self.move(request.POST.get('down'), 'down')
+        caches.invalidate_categories(request.user.pk)
+
+        # 非同期の場合は入れ替えたカードだけを返す
+        if request.is_ajax():
+            return self.move_response(moved)
+        if moved is None:
+            messages.error(self.request, self.conflict_message)
 
         # リストを再表示
-        return redirect('webapp:category_list')
+        response = redirect('webapp:category_list')
+        if self.parent_pk is not None:
+            response['location'] += '?parent={}'.format(self.parent_pk)
+        return response
+
+
+class CategorySearch(LoginRequiredMixin, ReplicaReadMixin, generic.View):
+    """
+    カテゴリ検索（入力補完用）
+    """
+    limit = 20
+
+    def get(self, request, **kwargs):
+        queryset = Category.objects.filter(owner=request.user)
+        query = request.GET.get('q', '').strip()
+        if query:
+            queryset = queryset.filter(name__icontains=query)
+        categories = queryset.order_by('order', '-created_at').values('id', 'name')[:self.limit]
+        return JsonResponse({'results': list(categories)})
 
 
 class CategoryCreate(LoginRequiredMixin, generic.CreateView):
@@ -329,13 +537,20 @@ class CategoryCreate(LoginRequiredMixin, generic.CreateView):
     template_name = 'category_create.html'
     success_url = reverse_lazy('webapp:top')
 
+    def get_form_kwargs(self):
+        # フォームにユーザーを渡す
+        kwargs = super().get_form_kwargs()
+        kwargs.update({ 'user': self.request.user })
+        return kwargs
+
+    def get_initial(self):
+        return {'parent': self.request.GET.get('parent')}
+
     def form_valid(self, form):
-        # その他のカテゴリの順序を+1する
-        categorys = []
-        for category in Category.objects.filter(owner=self.request.user):
-            category.order = category.order + 1
-            categorys.append(category)
-        Category.objects.bulk_update(categorys, fields=['order'])
+        # 兄弟のカテゴリの順序を+1する（並び替え中の操作は競合として検出される）
+        Category.objects.filter(owner=self.request.user, parent=form.instance.parent).update(
+            order=F('order') + 1,
+        )
 
         # オーナーを設定
         form.instance.owner = self.request.user
@@ -352,9 +567,40 @@ class CategoryUpdate(LoginRequiredMixin, UserPassesTestMixin, generic.UpdateView
     template_name = 'category_update.html'
     success_url = reverse_lazy('webapp:top')
 
+    def get_form_kwargs(self):
+        # フォームにカテゴリのオーナーを渡す
+        kwargs = super().get_form_kwargs()
+        kwargs.update({ 'user': self.object.owner })
+        return kwargs
+
+    @transaction.atomic
     def form_valid(self, form):
-        messages.success(self.request, 'カテゴリ（{}）を変更しました。'.format(form.instance.name))
-        return super().form_valid(form)
+        # 編集中に他で変更されていなければ名前だけを書き込む
+        # （経路・階層・順序は読み込んだ値で上書きしない）
+        category = form.instance
+        version = form.cleaned_data['version']
+        updated = Category.objects.filter(pk=category.pk, owner_id=category.owner_id, version=version).update(
+            name=category.name,
+            version=F('version') + 1,
+            updated_at=timezone.now(),
+        )
+        if not updated:
+            form.add_error(None, '他の画面でカテゴリが変更されています。ページを再読み込みしてから変更してください。')
+            return self.form_invalid(form)
+
+        # 親カテゴリを変更した場合は移動先の先頭にする（子孫のカテゴリも一緒に移動する）
+        if 'parent' in form.changed_data:
+            parent = form.cleaned_data['parent']
+            current = Category.objects.get(pk=category.pk, owner_id=category.owner_id)
+            Category.objects.filter(owner_id=category.owner_id, parent=parent).update(
+                order=F('order') + 1,
+            )
+            move_category(current, parent)
+            Category.objects.filter(pk=category.pk, owner_id=category.owner_id).update(order=0)
+        caches.invalidate_categories(category.owner_id)
+
+        messages.success(self.request, 'カテゴリ（{}）を変更しました。'.format(category.name))
+        return redirect(self.get_success_url())
 
     def test_func(self):
         # オーナー or スーパーユーザーのみアクセスを許可する
@@ -363,6 +609,126 @@ class CategoryUpdate(LoginRequiredMixin, UserPassesTestMixin, generic.UpdateView
         return user == category.owner or user.is_superuser
 
 
+class CategoryDuplicate(LoginRequiredMixin, UserPassesTestMixin, generic.CreateView):
+    """
+    カテゴリ複製ページ
+    """
+    model = Category
+    form_class = forms.CategoryForm
+    template_name = 'category_duplicate.html'
+    success_url = reverse_lazy('webapp:top')
+
+    @cached_property
+    def source(self):
+        # 複製元のカテゴリ
+        return get_object_or_404(Category, pk=self.kwargs['pk'])
+
+    @cached_property
+    def descendants(self):
+        # 複製元の子孫のカテゴリ（親→子の順、複製先を追加する前に読み込む）
+        return tree_order(self.source.subtree().exclude(pk=self.source.pk))
+
+    def get_form_kwargs(self):
+        # フォームに複製元のカテゴリのオーナーを渡す
+        kwargs = super().get_form_kwargs()
+        kwargs.update({ 'user': self.source.owner })
+        return kwargs
+
+    def get_initial(self):
+        return {'name': '{}のコピー'.format(self.source.name), 'parent': self.source.parent_id}
+
+    def get_context_data(self, **kwargs):
+        # 子孫のカテゴリを含めたカテゴリ数・アイテム数を設定
+        context = super().get_context_data(**kwargs)
+        context['source'] = self.source
+        context['descendant_count'] = len(self.descendants)
+        context['item_count'] = Item.objects.filter(
+            owner_id=self.source.owner_id,
+            category__in=[self.source] + self.descendants,
+        ).count()
+        return context
+
+    @transaction.atomic
+    def form_valid(self, form):
+        # 複製先の下に子孫のカテゴリを含めた階層が収まるか確認
+        parent = form.cleaned_data['parent']
+        height = max([c.depth for c in self.descendants], default=self.source.depth) - self.source.depth + 1
+        if len(parent.path if parent else '/') + 11 * height > Category._meta.get_field('path').max_length:
+            form.add_error('parent', 'これ以上深い階層にはできません。')
+            return self.form_invalid(form)
+
+        # 兄弟のカテゴリの順序を+1する（並び替え中の操作は競合として検出される）
+        Category.objects.filter(owner_id=self.source.owner_id, parent=parent).update(
+            order=F('order') + 1,
+        )
+
+        # オーナーを設定してカテゴリを追加し、アイテムをまとめて複製する
+        form.instance.owner_id = self.source.owner_id
+        result = super().form_valid(form)
+        count = self.copy_items(self.source, self.object)
+
+        # 子孫のカテゴリも同じ階層で複製する（順序は兄弟の中で0からの連番にする）
+        copies = {self.source.pk: self.object}
+        orders = {}
+        for category in self.descendants:
+            order = orders.get(category.parent_id, 0)
+            orders[category.parent_id] = order + 1
+            copy = Category.objects.create(
+                owner_id=category.owner_id,
+                name=category.name,
+                parent=copies[category.parent_id],
+                order=order,
+            )
+            copies[category.pk] = copy
+            count += self.copy_items(category, copy)
+
+        messages.success(self.request, 'カテゴリ（{}）と{}件のアイテムを複製しました。'.format(self.object.name, count))
+        return result
+
+    def copy_items(self, source, category):
+        """
+        カテゴリ内のアイテムを1回のINSERT ... SELECTで複製する
+        （アーカイブ済みのアイテムは除き、画像ファイルはコピーせずに共有し、順序は0からの連番にする）
+        """
+        qn = connection.ops.quote_name
+        now = timezone.now()
+        # 複製元から値を変える列（それ以外の列はそのままコピーする）
+        overrides = {
+            'category_id': ('%s', [category.pk]),
+            'order': ('ROW_NUMBER() OVER (ORDER BY {}, {} DESC) - 1'.format(qn('order'), qn('created_at')), []),
+            'version': ('0', []),
+            'created_at': ('%s', [now]),
+            'updated_at': ('%s', [now]),
+        }
+        columns = [field.column for field in Item._meta.concrete_fields if not field.primary_key]
+        values = []
+        params = []
+        for column in columns:
+            value, value_params = overrides.get(column, (qn(column), []))
+            values.append(value)
+            params += value_params
+        sql = (
+            'INSERT INTO {table} ({columns}) SELECT {values} FROM {table} '
+            'WHERE {owner} = %s AND {category} = %s AND {archived_at} IS NULL'
+        ).format(
+            table=qn(Item._meta.db_table),
+            columns=', '.join(qn(column) for column in columns),
+            values=', '.join(values),
+            owner=qn('owner_id'),
+            category=qn('category_id'),
+            archived_at=qn('archived_at'),
+        )
+        params += [source.owner_id, source.pk]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.rowcount
+
+    def test_func(self):
+        # オーナー or スーパーユーザーのみアクセスを許可する
+        user = self.request.user
+        return user.pk == self.source.owner_id or user.is_superuser
+
+
 class CategoryDelete(LoginRequiredMixin, UserPassesTestMixin, generic.DeleteView):
     """
     カテゴリ削除ページ
@@ -372,8 +738,21 @@ class CategoryDelete(LoginRequiredMixin, UserPassesTestMixin, generic.DeleteView
     success_url = reverse_lazy('webapp:top')
 
     def delete(self, request, *args, **kwargs):
-        result = super().delete(request, *args, **kwargs)
-        messages.success(self.request, 'カテゴリ（{}）を削除しました。'.format(self.object.name))
+        # 子孫のカテゴリごと削除されるアイテムの画像の使用容量を減らす
+        category = self.get_object()
+        items = Item.all_objects.filter(owner_id=category.owner_id, category__in=category.subtree())
+        with releasing_media(items):
+            result = super().delete(request, *args, **kwargs)
+        message = 'カテゴリ（{}）を削除しました。'.format(self.object.name)
+
+        # 非同期の場合は削除したカードと同じ階層の最初・最後のpkだけを返す
+        if request.is_ajax():
+            queryset = Category.objects.filter(
+                owner_id=self.object.owner_id,
+                parent_id=self.object.parent_id,
+            ).order_by('order', '-created_at')
+            return JsonResponse(dict(edge_pks(queryset), deleted=int(kwargs['pk']), message=message))
+        messages.success(self.request, message)
         return result
 
     def get_context_data(self, **kwargs):
@@ -382,6 +761,7 @@ class CategoryDelete(LoginRequiredMixin, UserPassesTestMixin, generic.DeleteView
         category = self.get_object()
         item_list = Item.objects.filter(owner=self.request.user).filter(category=category).order_by('order', '-created_at')
         context['item_list'] = item_list
+        context['descendant_count'] = category.subtree().exclude(pk=category.pk).count()
         return context
 
     def test_func(self):
@@ -391,14 +771,20 @@ class CategoryDelete(LoginRequiredMixin, UserPassesTestMixin, generic.DeleteView
         return user == category.owner or user.is_superuser
 
 
-class ItemList(LoginRequiredMixin, generic.ListView):
+class ItemList(LoginRequiredMixin, ReplicaReadMixin, OrderMoveMixin, generic.ListView):
     """
     アイテム一覧ページ
     """
     model = Item
     context_object_name = 'item_list'
     template_name = 'item_list.html'
-    paginate_by = 10
+    card_template_name = '_item_card.html'
+    tail_template_name = '_item_list_tail.html'
+    paginate_by = getattr(settings, 'ITEM_LIST_PAGE_SIZE', 10)
+    paginator_class = CountFreePaginator if getattr(settings, 'PAGINATION_COUNT_FREE', False) else Paginator
+    streaming = getattr(settings, 'ITEM_LIST_STREAMING', False)
+    # カードのヘッダーと抜粋に必要な列
+    list_fields = ('id', 'title', 'url', 'mark', 'excerpt', 'category', 'order', 'owner', 'created_at')
 
     def get_queryset(self):
         # オーナー＆カテゴリで絞り込み
@@ -408,6 +794,10 @@ class ItemList(LoginRequiredMixin, generic.ListView):
             queryset = queryset.filter(category__isnull=True)
         else:
             queryset = queryset.filter(category=category_pk)
+
+        # ストリーミングの場合は説明・画像を読み込まない
+        if self.streaming:
+            queryset = queryset.only(*self.list_fields)
         return queryset.order_by('order', '-created_at')
 
     def get_context_data(self, **kwargs):
@@ -421,36 +811,79 @@ class ItemList(LoginRequiredMixin, generic.ListView):
             if category_pk is not None:
                 context['category'] = category_list.get(pk=category_pk)
 
-        # リストの最初と最後のアイテムを設定
-        if len(self.object_list) > 0:
-            context['first_pk'] = self.object_list.first().pk
-            context['last_pk'] = self.object_list.last().pk
+        # リストの最初と最後のアイテムを設定（ストリーミングの場合は前半の送信後）
+        if not self.streaming:
+            context.update(edge_pks(self.object_list))
+        context['streaming'] = self.streaming
         return context
 
-    @transaction.atomic
+    def get_paginate_by(self, queryset):
+        # ストリーミングの場合はページの前半を送信してから分割する
+        if self.streaming:
+            return None
+        return super().get_paginate_by(queryset)
+
+    def get_tail_context(self):
+        """
+        カード・後半の描画に必要なページ分割と最初・最後のpk
+        """
+        paginator = self.get_paginator(
+            self.object_list, self.paginate_by,
+            orphans=self.get_paginate_orphans(),
+            allow_empty_first_page=self.get_allow_empty(),
+        )
+        try:
+            page = paginator.page(self.request.GET.get(self.page_kwarg) or 1)
+        except InvalidPage:
+            # 送信済みのため404にはできないので先頭のページを表示する
+            page = paginator.page(1)
+        return dict(
+            edge_pks(self.object_list),
+            paginator=paginator,
+            page_obj=page,
+            is_paginated=page.has_other_pages(),
+            object_list=page.object_list,
+            item_list=page.object_list,
+        )
+
+    def render_to_response(self, context, **response_kwargs):
+        if not self.streaming:
+            return super().render_to_response(context, **response_kwargs)
+        return StreamingHttpResponse(self.stream(context), content_type='text/html; charset=utf-8')
+
+    def stream(self, context):
+        """
+        ページの前半・カード・後半の順に送信する
+        （ページの枠にはカード・後半を含めず、前半を送信してからリスト・件数を読み込んで描画する）
+        """
+        # 送信中の読み込みもレプリカで行う
+        with replica_reads() if self.use_replica() else nullcontext():
+            head, rest = render_to_string(self.template_name, context, self.request).split(CARDS_MARKER)
+            middle, end = rest.split(TAIL_MARKER)
+            yield head
+            context = dict(context, **self.get_tail_context())
+            card = get_template(self.card_template_name)
+            for item in context['item_list']:
+                yield card.render(dict(context, item=item), self.request)
+            yield middle
+            yield render_to_string(self.tail_template_name, context, self.request)
+            yield end
+
     def post(self, request, **kwargs):
-        self.object_list = self.get_queryset()
+        moved = []
         if 'up' in request.POST:
             # 上に移動
-            current_pk = request.POST.get('up')
-            current = self.object_list.get(pk=current_pk)
-            prev = self.object_list.filter(order__lt=current.order).last()
-            prev_order = prev.order
-            prev.order = current.order
-            current.order = prev_order
-            current.save()
-            prev.save()
+            moved = self.move(request.POST.get('up'), 'up')
 
         elif 'down' in request.POST:
             # 下に移動
-            current_pk = request.POST.get('down')
-            current = self.object_list.get(pk=current_pk)
-            next = self.object_list.filter(order__gt=current.order).first()
-            next_order = next.order
-            next.order = current.order
-            current.order = next_order
-            current.save()
-            next.save()
+            moved = self.move(request.POST.get('down'), 'down')
+
+        # 非同期の場合は入れ替えたカードだけを返す
+        if request.is_ajax():
+            return self.move_response(moved)
+        if moved is None:
+            messages.error(self.request, self.conflict_message)
 
         # リストを再表示
         response = redirect('webapp:item_list')
@@ -459,8 +892,82 @@ class ItemList(LoginRequiredMixin, generic.ListView):
             response['location'] += '?category={}'.format(category_pk)
         return response
 
+    def get_card_context(self, obj):
+        # 編集・削除のリンクにカテゴリを引き継ぐ
+        context = super().get_card_context(obj)
+        context['category'] = Category(pk=obj.category_id) if obj.category_id else None
+        context['streaming'] = self.streaming
+        return context
+
 
-class ItemCreate(LoginRequiredMixin, generic.CreateView):
+class ItemBody(LoginRequiredMixin, ReplicaReadMixin, generic.DetailView):
+    """
+    アイテムの説明・画像（一覧のカードを開いたときに読み込む）
+    """
+    model = Item
+    context_object_name = 'item'
+
+    def get_queryset(self):
+        # オーナーで絞り込む（パーティションの絞り込みのため）
+        return super().get_queryset().filter(owner=self.request.user)
+
+    def get_template_names(self):
+        if self.request.is_ajax():
+            return ['_item_body.html']
+        return ['item_body.html']
+
+
+class ItemArchive(LoginRequiredMixin, ReplicaReadMixin, generic.ListView):
+    """
+    アーカイブ済みアイテム一覧ページ
+    """
+    context_object_name = 'item_list'
+    template_name = 'item_archive.html'
+    paginate_by = 10
+    paginator_class = CountFreePaginator if getattr(settings, 'PAGINATION_COUNT_FREE', False) else Paginator
+
+    def get_queryset(self):
+        # アーカイブ済みのアイテムは必要なときだけ読み込む
+        return Item.all_objects.filter(
+            owner=self.request.user,
+            archived_at__isnull=False,
+        ).select_related('category').order_by('-archived_at', '-pk')
+
+    @transaction.atomic
+    def post(self, request, **kwargs):
+        # 元のカテゴリの先頭に戻す（その他のアイテムの順序を+1する）
+        try:
+            pk = int(request.POST.get('restore'))
+        except (TypeError, ValueError):
+            raise Http404
+        item = get_object_or_404(self.get_queryset(), pk=pk)
+        Item.objects.filter(owner=request.user, category_id=item.category_id).update(
+            order=F('order') + 1,
+        )
+        Item.all_objects.filter(pk=item.pk, owner=request.user).update(
+            archived_at=None,
+            order=0,
+            version=F('version') + 1,
+            updated_at=timezone.now(),
+        )
+        messages.success(self.request, 'アイテム（{}）を元に戻しました。'.format(item.title))
+        return redirect('webapp:item_archive')
+
+
+class MediaQuotaMixin:
+    """
+    保存時に画像の使用容量の上限を超えた場合にフォームのエラーにする
+    """
+    def quota_exceeded(self, form):
+        # 保存済みのアップロード画像を削除する（保存はロールバック済み）
+        if form.instance.image:
+            tasks.enqueue(tasks.delete_files, [form.instance.image.name])
+        used = User.objects.filter(pk=form.owner.pk).values_list('media_bytes', flat=True).first()
+        form.add_error('image', form.quota_error(used or 0))
+        return self.form_invalid(form)
+
+
+class ItemCreate(LoginRequiredMixin, MediaQuotaMixin, generic.CreateView):
     """
     アイテム追加ページ
     """
@@ -476,17 +983,20 @@ class ItemCreate(LoginRequiredMixin, generic.CreateView):
         return kwargs
 
     def form_valid(self, form):
-        # その他のアイテムの順序を+1する
-        items = []
-        for item in Item.objects.filter(owner=self.request.user):
-            item.order = item.order + 1
-            items.append(item)
-        Item.objects.bulk_update(items, fields=['order'])
-
-        # オーナーを設定
-        form.instance.owner = self.request.user
+        try:
+            with transaction.atomic():
+                # その他のアイテムの順序を+1する（並び替え中の操作は競合として検出される）
+                Item.objects.filter(owner=self.request.user).update(
+                    order=F('order') + 1,
+                )
+
+                # オーナーを設定
+                form.instance.owner = self.request.user
+                response = super().form_valid(form)
+        except MediaQuotaExceeded:
+            return self.quota_exceeded(form)
         messages.success(self.request, 'アイテム（{}）を追加しました。'.format(form.instance.title))
-        return super().form_valid(form)
+        return response
 
     def get_success_url(self):
         success_url = reverse_lazy('webapp:item_list')
@@ -496,13 +1006,15 @@ class ItemCreate(LoginRequiredMixin, generic.CreateView):
         return success_url
 
 
-class ItemUpdate(LoginRequiredMixin, UserPassesTestMixin, generic.UpdateView):
+class ItemUpdate(LoginRequiredMixin, UserPassesTestMixin, MediaQuotaMixin, generic.UpdateView):
     """
     アイテム変更ページ
     """
     model = Item
     form_class = forms.ItemForm
     template_name = 'item_update.html'
+    # 保存する列（順序は並び替えで、バージョンは同時更新の確認で更新する）
+    update_fields = ('title', 'description', 'excerpt', 'image', 'image_size', 'url', 'mark', 'category', 'updated_at')
 
     def get_form_kwargs(self):
         # フォームにユーザー＆カテゴリを渡す
@@ -512,8 +1024,23 @@ class ItemUpdate(LoginRequiredMixin, UserPassesTestMixin, generic.UpdateView):
         return kwargs
 
     def form_valid(self, form):
+        try:
+            with transaction.atomic():
+                # 編集中に他で変更されていないか確認
+                version = form.cleaned_data['version']
+                updated = Item.objects.filter(
+                    pk=self.object.pk, owner_id=self.object.owner_id, version=version
+                ).update(version=F('version') + 1)
+                if not updated:
+                    form.add_error(None, '他の画面でアイテムが変更されています。ページを再読み込みしてから変更してください。')
+                    return self.form_invalid(form)
+                form.instance.version = version + 1
+                self.object = form.save(commit=False)
+                Item.all_objects.save_fields(self.object, self.update_fields)
+        except MediaQuotaExceeded:
+            return self.quota_exceeded(form)
         messages.success(self.request, 'アイテム（{}）を変更しました。'.format(form.instance.title))
-        return super().form_valid(form)
+        return redirect(self.get_success_url())
 
     def get_success_url(self):
         success_url = reverse_lazy('webapp:item_list')
@@ -522,6 +1049,13 @@ class ItemUpdate(LoginRequiredMixin, UserPassesTestMixin, generic.UpdateView):
             success_url += '?category={}'.format(category_pk)
         return success_url
 
+    def get_queryset(self):
+        # オーナーで絞り込む（パーティションの絞り込みのため）
+        queryset = super().get_queryset()
+        if not self.request.user.is_superuser:
+            queryset = queryset.filter(owner=self.request.user)
+        return queryset
+
     def test_func(self):
         # オーナー or スーパーユーザーのみアクセスを許可する
         user = self.request.user
@@ -537,8 +1071,23 @@ class ItemDelete(LoginRequiredMixin, UserPassesTestMixin, generic.DeleteView):
     template_name = 'item_delete.html'
 
     def delete(self, request, *args, **kwargs):
-        result = super().delete(request, *args, **kwargs)
-        messages.success(self.request, 'アイテム（{}）を削除しました。'.format(self.object.title))
+        # 主キーに加えてオーナーを指定して削除する（パーティションの絞り込みのため）
+        # 画像の使用容量は削除前に計算して削除と同じトランザクションで減らす
+        self.object = self.get_object()
+        items = Item.all_objects.filter(pk=self.object.pk, owner_id=self.object.owner_id)
+        with releasing_media(items):
+            items.delete()
+        result = redirect(self.get_success_url())
+        message = 'アイテム（{}）を削除しました。'.format(self.object.title)
+
+        # 非同期の場合は削除したカードと最初・最後のpkだけを返す
+        if request.is_ajax():
+            queryset = Item.objects.filter(
+                owner_id=self.object.owner_id,
+                category_id=self.object.category_id,
+            ).order_by('order', '-created_at')
+            return JsonResponse(dict(edge_pks(queryset), deleted=int(kwargs['pk']), message=message))
+        messages.success(self.request, message)
         return result
 
     def get_success_url(self):
@@ -548,8 +1097,42 @@ class ItemDelete(LoginRequiredMixin, UserPassesTestMixin, generic.DeleteView):
             success_url += '?category={}'.format(category_pk)
         return success_url
 
+    def get_queryset(self):
+        # オーナーで絞り込む（パーティションの絞り込みのため）
+        queryset = super().get_queryset()
+        if not self.request.user.is_superuser:
+            queryset = queryset.filter(owner=self.request.user)
+        return queryset
+
     def test_func(self):
         # オーナー or スーパーユーザーのみアクセスを許可する
         user = self.request.user
         item = self.get_object()
         return user == item.owner or user.is_superuser
+
+
+class Healthz(generic.View):
+    """
+    死活監視（セッション・認証・データベースを使わない）
+    """
+    def get(self, request, **kwargs):
+        return HttpResponse('ok', content_type='text/plain')
+
+
+class Readyz(generic.View):
+    """
+    準備完了の確認（このプロセスでウォームアップが終わり、全データベースに接続できる場合のみ200を返す）
+    """
+    def get(self, request, **kwargs):
+        if getattr(settings, 'STARTUP_WARMUP', False) and not warmup.done:
+            return HttpResponse('warming up', content_type='text/plain', status=503)
+        # ウォームアップで接続できなかったデータベースは接続できるまで確認する
+        warmup.failed = warmup.warm_connections() if warmup.failed else []
+        try:
+            with connections['default'].cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except DatabaseError:
+            return HttpResponse('database unavailable', content_type='text/plain', status=503)
+        if warmup.failed:
+            return HttpResponse('database unavailable: {}'.format(', '.join(warmup.failed)), content_type='text/plain', status=503)
+        return HttpResponse('ok', content_type='text/plain')
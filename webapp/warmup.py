@@ -0,0 +1,94 @@
+import logging
+import os
+from django.db import DatabaseError, connections
+from django.template import engines
+from django.template.loaders.cached import Loader as CachedLoader
+from django.template.utils import get_app_template_dirs
+from django.urls import URLResolver, get_resolver
+
+logger = logging.getLogger(__name__)
+
+# ウォームアップが終わったかどうか・接続できなかったデータベース（/readyzで使う）
+done = False
+failed = []
+
+
+def template_names():
+    """
+    テンプレートディレクトリにある全テンプレートの名前を返す
+    """
+    names = set()
+    for engine in engines.all():
+        dirs = list(getattr(engine, 'dirs', []))
+        if getattr(engine, 'app_dirs', False) or _cached_loaders(engine):
+            dirs += list(get_app_template_dirs('templates'))
+        for template_dir in dirs:
+            for root, _, files in os.walk(template_dir):
+                for file in files:
+                    path = os.path.join(root, file)
+                    names.add(os.path.relpath(path, template_dir).replace(os.sep, '/'))
+    return sorted(names)
+
+
+def warm_templates():
+    """
+    キャッシュローダーが有効な場合に全テンプレートを読み込んでコンパイル済みにする
+    """
+    count = 0
+    for engine in engines.all():
+        if not _cached_loaders(engine):
+            continue
+        for name in template_names():
+            engine.get_template(name)
+            count += 1
+    return count
+
+
+def warm_urls(resolver=None):
+    """
+    URLconfを読み込んで全パターンの正規表現をコンパイルし、逆引きの辞書を作っておく
+    """
+    resolver = resolver or get_resolver()
+    count = 0
+    for pattern in resolver.url_patterns:
+        pattern.pattern.regex
+        if isinstance(pattern, URLResolver):
+            count += warm_urls(pattern)
+        else:
+            count += 1
+    resolver.reverse_dict
+    return count
+
+
+def warm_connections():
+    """
+    全データベースに接続しておく（接続できないデータベースの名前を返す）
+    """
+    failed = []
+    for alias in connections:
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError:
+            logger.warning('Could not connect to database %s during warm-up', alias, exc_info=True)
+            failed.append(alias)
+    return failed
+
+
+def warm_up():
+    """
+    最初のリクエストの前にURL・テンプレート・データベース接続を準備する
+    （サーバーのワーカーがWSGIアプリケーションを読み込むときに呼ぶ）
+    """
+    global done, failed
+    urls = warm_urls()
+    templates = warm_templates()
+    failed = warm_connections()
+    done = True
+    logger.info('Warmed up %d url patterns, %d templates, failed databases: %s', urls, templates, failed or 'none')
+
+
+def _cached_loaders(engine):
+    template_engine = getattr(engine, 'engine', None)
+    if template_engine is None:
+        return []
+    return [loader for loader in template_engine.template_loaders if isinstance(loader, CachedLoader)]